@@ -3,18 +3,14 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-import sys
-import os
 import logging
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from api.db import get_user_by_username, create_user, verify_password, create_access_token, decode_access_token
 from api.services.db_session import get_db
 
 bearer_scheme = HTTPBearer()
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(module)s %(message)s')
 
 def get_current_user(db: Session = Security(get_db), credentials: HTTPAuthorizationCredentials = Security(bearer_scheme)):
     """
@@ -53,7 +49,7 @@ class UserAuthRequest(BaseModel):
     password: str
 
 @user_router.post("/register", response_model=dict)
-async def register(body: UserAuthRequest, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+def register(body: UserAuthRequest, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
     """
     Register a new user.  
 
@@ -81,7 +77,7 @@ async def register(body: UserAuthRequest, db: Session = Depends(get_db), current
     return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"detail": "Registration failed"})
 
 @user_router.post("/login", response_model=dict)
-async def login(body: UserAuthRequest, db: Session = Depends(get_db)):
+def login(body: UserAuthRequest, db: Session = Depends(get_db)):
     """
     Log in an existing user.  
 
@@ -103,7 +99,7 @@ async def login(body: UserAuthRequest, db: Session = Depends(get_db)):
     return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Invalid credentials"})
 
 @user_router.delete("/delete_account", response_model=dict)
-async def delete_account(db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+def delete_account(db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
     """
     Delete the currently authenticated user's account.
 
@@ -6,7 +6,6 @@ from fastapi import HTTPException
 from typing import Optional
 from pymongo import MongoClient
 from sqlalchemy.orm import Session
-import os
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -47,7 +46,6 @@ def create_user(db: Session, username: str, password: str, user_level: str = "us
     try:
         db.add(db_user)
         db.commit()
-        db.refresh(db_user)
         return db_user
     except Exception as e:
         db.rollback()
@@ -117,6 +115,39 @@ def get_mongodb_connection():
         print(f"Error connecting to MongoDB: {e}")
         return None
 
+_shared_mongodb_client: Optional[MongoClient] = None
+
+def get_shared_mongodb_client() -> MongoClient:
+    """
+    Retourne le client MongoDB partagé par les requêtes de l'API, créé au premier appel.
+    Le client gère son propre pool de connexions et ne doit pas être fermé par les routes.
+
+    Returns:
+        pymongo.MongoClient: Client MongoDB partagé.
+    """
+    global _shared_mongodb_client
+    if _shared_mongodb_client is None:
+        _shared_mongodb_client = MongoClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017/"), serverSelectionTimeoutMS=5000, maxPoolSize=50)
+    return _shared_mongodb_client
+
+def close_shared_mongodb_client():
+    """
+    Ferme le client MongoDB partagé s'il a été créé (à l'arrêt de l'API).
+    """
+    global _shared_mongodb_client
+    if _shared_mongodb_client is not None:
+        _shared_mongodb_client.close()
+        _shared_mongodb_client = None
+
+def get_mongo_collection():
+    """
+    Dépendance FastAPI retournant la collection MongoDB des recettes, via le client partagé.
+
+    Returns:
+        pymongo.collection.Collection: Collection des recettes.
+    """
+    return get_shared_mongodb_client()[os.getenv("MONGODB_DB", "OpenFoodImpact")]["recipes"]
+
 if __name__ == "__main__":
     import getpass
     from api.services.db_session import SessionLocal
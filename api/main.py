@@ -1,20 +1,57 @@
 import time
+import hashlib
 import os
 import sys
 import logging
+from contextlib import asynccontextmanager
 from typing import Callable
 from fastapi import FastAPI, Depends, Request
-from fastapi.responses import RedirectResponse
-from routers import secure, public
+from fastapi.responses import RedirectResponse, Response
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.routers import secure, public
 from api.auth import user_router, get_current_user
+from api.db import close_shared_mongodb_client
+from api.services.db_session import get_psycopg2_connection, release_psycopg2_connection
+from api.services.product_creation import create_product_jobs_table
+from processing.build_ingredient_links import create_ingredient_link_table, create_ingredient_name_link_table
+from processing.utils import vectorize_names
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(module)s %(message)s')
+# niveau de log configurable (LOG_LEVEL=DEBUG active le détail des étapes et leurs durées)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper(), format='%(asctime)s %(levelname)s %(module)s %(message)s')
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Prépare la base au démarrage de l'application : les tables ingredient_link, ingredient_name_link et product_jobs sont créées une seule fois ici,
+    plutôt qu'à chaque création de produit. Le modèle de vectorisation est chargé et exécuté une première fois,
+    pour que la première création de produit n'en paie pas le coût. Ferme le client MongoDB partagé à l'arrêt.
+
+    Args:
+        app (FastAPI): L'application FastAPI.
+    """
+    pg_conn = None
+    try:
+        pg_conn = get_psycopg2_connection()
+        create_ingredient_link_table(pg_conn)
+        create_ingredient_name_link_table(pg_conn)
+        create_product_jobs_table(pg_conn)
+    except Exception as e:
+        logger.error(f"Error during ingredient_link / ingredient_name_link / product_jobs tables initialization: {e}", exc_info=True)
+    finally:
+        if pg_conn:
+            release_psycopg2_connection(pg_conn)
+    try:
+        vectorize_names(["pomme"])
+    except Exception as e:
+        logger.error(f"Error during vectorization model warm-up: {e}", exc_info=True)
+    yield
+    close_shared_mongodb_client()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="DataFoodImpact API",
     description="""API for managing recipes and products, with their nutritional and environmental information. 
     You can create, update, and retrieve recipes and products, as well as manage user accounts.""",
@@ -44,6 +81,38 @@ async def add_timer_middleware(request: Request, call_next: Callable):
     response.headers['X-Execution-Time'] = str(round(elapsed_time, 2))
     return response
 
+@app.middleware("http")
+async def add_etag_middleware(request: Request, call_next: Callable):
+    """
+    Middleware ajoutant un en-tête ETag aux réponses GET 200 des routes publiques ; les autres réponses ne sont pas mises en mémoire.
+    Si le client renvoie le même ETag via If-None-Match, une réponse 304 sans corps est renvoyée.
+
+    Args:
+        request (Request): Requête entrante.
+        call_next (Callable): Prochain appel dans le pipeline de la requête.
+    Returns:
+        Response: Réponse avec l'en-tête ETag, ou réponse 304 si le contenu n'a pas changé.
+    """
+    if request.method != "GET" or not request.url.path.startswith("/api/public"):
+        return await call_next(request)
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator]) # type: ignore
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    if request.headers.get("if-none-match") == etag:
+        not_modified = Response(status_code=304, headers={"ETag": etag})
+        # le 304 reprend les en-têtes de cache de la réponse 200 qu'il remplace
+        for header_name in ("cache-control", "vary"):
+            if header_name in response.headers:
+                not_modified.headers[header_name] = ", ".join(response.headers.getlist(header_name))
+        return not_modified
+    etag_response = Response(content=body, status_code=response.status_code)
+    # en-têtes d'origine repris tels quels (dont plusieurs Set-Cookie, qu'un dict fusionnerait) ; le corps, et donc Content-Length, est inchangé
+    etag_response.raw_headers = list(response.raw_headers)
+    etag_response.headers["ETag"] = etag
+    return etag_response
+
 @app.get("/", include_in_schema=False)
 def root():
     return RedirectResponse(url="/docs")
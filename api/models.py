@@ -12,8 +12,8 @@ class Recipe(BaseModel):
     cookTime: Optional[str] = None
     totalTime: Optional[str] = None
     recipeYield: Optional[str] = None
-    recipeIngredient: Optional[List[str]]
-    recipeInstructions: Optional[List[str]]
+    recipeIngredient: Optional[List[str]] = None
+    recipeInstructions: Optional[List[str]] = None
     author: Optional[str] = None
     description: Optional[str] = None
     keywords: Optional[str] = None
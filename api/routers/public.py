@@ -1,20 +1,17 @@
 import logging
 from fastapi import APIRouter, Query, Path, HTTPException, status, Depends
 from typing import Any, Dict, List, Optional # type: ignore
-import os
 from dotenv import load_dotenv
-import sys
 from bson import ObjectId
 from sqlalchemy.orm import Session
-
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from pymongo import MongoClient
+from pymongo.collection import Collection
 
 from processing.utils import normalize_name, vectorize_name
-from api.db import get_mongodb_connection
+from api.db import get_mongo_collection, get_shared_mongodb_client
 from api.services.db_session import get_db
 from api.services.query_helper import build_recipe_query_conditions, get_recipe_sort_criteria, IngredientMatchType, SortCriteria
 from api.services.product_query_helper import _get_linked_product_vector_ids, _get_product_vector_ids_by_name, _fetch_recipes_for_ingredient, _get_processed_products, _aggregate_product_details, get_enriched_recipes_details
-import logging
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -54,7 +51,7 @@ router = APIRouter()
         500: {"description": "Failed to connect to MongoDB or other server error."}
     }
 )
-async def get_recipes(
+def get_recipes(
     text_search: Optional[str] = Query(None, description="Text to search in title, name, keywords, and description"),
     ingredients: Optional[List[str]] = Query(None, description="List of ingredients to search for"),
     ingredient_match_type: IngredientMatchType = Query(IngredientMatchType.ALL, description="How to match ingredients: 'all' (default) or 'any'"),
@@ -67,7 +64,8 @@ async def get_recipes(
     include_details: bool = Query(False, description="Include aggregated nutritional and environmental details for each recipe. This can significantly increase response time."),
     min_linked_similarity_score_for_details: float = Query(0.60, ge=0, le=1, description="When including details: minimum similarity score for linked products (0-1)."),
     min_initial_name_similarity_for_details: float = Query(0.25, ge=0, le=1, description="When including details: minimum fuzzy similarity for initial ingredient name search (0-1)."),
-    db_pg: Session = Depends(get_db)
+    db_pg: Session = Depends(get_db),
+    collection: Collection = Depends(get_mongo_collection)
 ):
     """
     Retrieve a list of recipes with optional filters and sorting.  
@@ -88,13 +86,8 @@ async def get_recipes(
     Returns:  
         dict: Dictionary with status, message, recipe data, and total count.  
     """
-    mongo_client = get_mongodb_connection()
-    if not mongo_client:
-        return {"success": False, "message": "Failed to connect to MongoDB", "data": [], "count": 0}
+    # collection issue du client MongoDB partagé (son pool de connexions est réutilisé entre les requêtes)
     try:
-        db_mongo = mongo_client["OpenFoodImpact"]
-        collection = db_mongo["recipes"]
-
         # on construit la requête MongoDB en fonction des paramètres
         query_conditions = build_recipe_query_conditions(
             text_search, ingredients, ingredient_match_type,
@@ -116,7 +109,8 @@ async def get_recipes(
         cursor = collection.find(mongo_query, projection)
         if sort_criteria_list:
             cursor = cursor.sort(sort_criteria_list)
-        recipes_data = list(cursor.skip(skip).limit(limit))
+        # batch_size=limit : toutes les recettes demandées arrivent en un seul aller-retour
+        recipes_data = list(cursor.skip(skip).limit(limit).batch_size(limit))
 
         # si le paramètre include details est True, on récupère les détails agrégés des ingrédients
         if include_details and recipes_data:
@@ -147,9 +141,6 @@ async def get_recipes(
             "data": recipes_data,
             "count": total_recipes_count
         }
-    finally:
-        if mongo_client:
-            mongo_client.close()
 
 
 @router.get(
@@ -194,11 +185,12 @@ async def get_recipes(
         500: {"description": "Server error."}
     }
 )
-async def get_recipe_by_id(
+def get_recipe_by_id(
     recipe_id: str = Path(..., description="The MongoDB ObjectId of the recipe."),
     min_linked_similarity_score_for_details: float = Query(0.60, ge=0, le=1, description="Minimum similarity score for linked products (0-1) for ingredient details."),
     min_initial_name_similarity_for_details: float = Query(0.25, ge=0, le=1, description="Minimum fuzzy similarity for initial ingredient name search (0-1) for ingredient details."),
-    db_pg: Session = Depends(get_db)
+    db_pg: Session = Depends(get_db),
+    collection: Collection = Depends(get_mongo_collection)
 ):
     """
     Retrieve a specific recipe by its MongoDB ObjectId, with enriched details.  
@@ -212,15 +204,7 @@ async def get_recipe_by_id(
     Raises:  
         HTTPException: If connection fails, ID is invalid, or recipe not found.  
     """
-    mongo_client = get_mongodb_connection()
-
-    if not mongo_client:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to connect to MongoDB")
-
     try:
-        db_mongo = mongo_client["OpenFoodImpact"]
-        collection = db_mongo["recipes"]
-
         try:
             object_id = ObjectId(recipe_id)
         except Exception:
@@ -249,9 +233,6 @@ async def get_recipe_by_id(
         raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred: {str(e)}")
-    finally:
-        if mongo_client:
-            mongo_client.close()
 
 @router.get(
     "/products",
@@ -298,13 +279,14 @@ async def get_recipe_by_id(
         500: {"description": "Failed to connect to databases or other server error."}
     }
 )
-async def get_products(
+def get_products(
     name_search: str = Query(..., description="Ingredient name to search for (required)."),
     min_similarity_score: float = Query(0.65, ge=0, le=1, description="Minimum similarity score for linked products (from ingredient_link table, 0 to 1)"),
     min_name_similarity: float = Query(0.3, ge=0, le=1, description="Minimum fuzzy similarity score for initial name search (pg_trgm similarity, 0 to 1)"),
     limit: int = Query(20, ge=1, description="Number of products to return"),
     skip: int = Query(0, ge=0, description="Number of products to skip"),
-    db_pg: Session = Depends(get_db)
+    db_pg: Session = Depends(get_db),
+    mongo_client: MongoClient = Depends(get_shared_mongodb_client)
 ):
     """
     Retrieve linked product information and associated recipes for an ingredient name.  
@@ -318,10 +300,8 @@ async def get_products(
     Returns:  
         dict: Dictionary with status, message, product and recipe data, and count.  
     """
-    mongo_client = None
-    print("appel requete")
+    logger.debug("appel requete")
     try:
-        mongo_client = get_mongodb_connection()
         # on normaliser et vectorise le nom de l'ingrédient pour trouver l'ensemble des ingrédients qui s'en rapprochent
         normalized_search_name = normalize_name(name_search)
         search_vector = vectorize_name(normalized_search_name)
@@ -380,7 +360,3 @@ async def get_products(
         }
     except Exception as e:
         return {"success": False, "message": f"An error occurred: {str(e)}", "data": None, "count": 0}
-    finally:
-        # db_pg géré par FastAPI
-        if mongo_client:
-            mongo_client.close()
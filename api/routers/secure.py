@@ -1,41 +1,56 @@
-from typing import Dict, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Dict
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
-import psycopg2 # For find_similar_ingredients
+from pymongo.collection import Collection
 import logging
-import sys
-import os
 import time
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from contextlib import contextmanager
 
 from api.auth import get_current_user
+from api.db import get_mongo_collection
 from api.models import Recipe # Keep for existing routes, consider moving to schemas if it's a Pydantic model
-from api.schemas.product import ProductCreate, ProductCreationResponse
-from api.services.db_session import get_db
-from api.sql_models import ProductVector, Agribalyse, OpenFoodFacts, GreenpeaceSeason
+from api.schemas.product import ProductCreate, ProductCreationResponse, ProductJobStatus
+from api.services.db_session import get_db, get_psycopg2_connection, release_psycopg2_connection
+from api.sql_models import ProductJob
 from api.services.product_creation import (
     normalize_and_validate_name,
     select_or_create_product_vector,
     process_agribalyse_payload,
     process_openfoodfacts_payload,
     process_greenpeace_payload,
-    commit_and_refresh,
-    update_ingredient_links
+    create_product_job,
+    commit_product_vector,
+    create_missing_product_vectors,
+    update_ingredient_links,
+    update_ingredient_links_for_products
 )
+from api.services.product_query_helper import clear_ingredient_details_cache
 
-from processing.utils import normalize_name, vectorize_name, get_db_connection as get_psycopg2_connection
+from processing.utils import normalize_name, parse_ingredient_details_fr_en
 from processing.ingredient_similarity import find_similar_ingredients
-from processing.build_ingredient_links import create_ingredient_link_table
 
-
-import logging
 logger = logging.getLogger(__name__)
-level = getattr(logging, "INFO", None)
-logging.basicConfig(level=level, format='%(asctime)s %(levelname)s %(module)s %(message)s')
 
 
 router = APIRouter()
 
+@contextmanager
+def _timed_step(step_times: Dict[str, float], step_name: str):
+    """
+    Mesure la durée d'une étape de traitement et la journalise, uniquement si le niveau DEBUG est actif.
+
+    Args:
+        step_times (Dict[str, float]): Les durées des étapes, complétées par cette étape.
+        step_name (str): Le nom de l'étape.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        yield
+        return
+    step_start = time.perf_counter()
+    yield
+    step_times[step_name] = time.perf_counter() - step_start
+    logger.debug("[STEP] %s done in %.4fs", step_name, step_times[step_name])
+
 @router.get("/", response_model=Dict[str, str], tags=["User"], summary="Get user info", description="Retrieve authenticated user information.")
 async def get_testroute(user: dict = Depends(get_current_user)):
     """
@@ -49,9 +64,11 @@ async def get_testroute(user: dict = Depends(get_current_user)):
     return user
 
 @router.post("/recipe", response_model=Recipe, tags=["Updates"], summary="Create a new recipe", description="Add a new recipe to MongoDB, normalizing and linking ingredients to product sources.")
-async def create_recipe(
+def create_recipe(
     recipe_data: Recipe,
-    db_sqla: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db_sqla: Session = Depends(get_db),
+    collection: Collection = Depends(get_mongo_collection)
 ):
     """
     Add a new recipe to MongoDB, normalizing and linking ingredients to product sources.  
@@ -60,21 +77,17 @@ async def create_recipe(
     
     Args:  
         recipe_data (Recipe): The recipe to insert.  
+        background_tasks (BackgroundTasks): Tasks run after the response is sent (ingredient links update).  
         db_sqla (Session): SQLAlchemy session dependency.  
+        collection (Collection): MongoDB recipes collection dependency.  
     Returns:  
         Recipe: The inserted recipe, including normalized and parsed ingredients, with id set to the MongoDB id.  
     """
-    from pymongo import MongoClient
-    from processing.utils import parse_ingredient_details_fr_en
-    mongo_client = MongoClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
-    db_mongo = mongo_client[os.getenv("MONGODB_DB", "OpenFoodImpact")]
-    collection = db_mongo["recipes"]
     # on vérifie si la recette existe déjà
     existing = collection.find_one({"title": recipe_data.title})
     if existing:
         mongo_id = str(existing.get("_id"))
-        mongo_client.close()
-        recipe_dict = recipe_data.dict(by_alias=True)
+        recipe_dict = recipe_data.model_dump(by_alias=True)
         recipe_dict["id"] = mongo_id
         return {**recipe_dict, "message": f"Recipe already exists with this title. Returning existing id."}
     normalized_ingredients = []
@@ -87,43 +100,41 @@ async def create_recipe(
         parsed["normalized_name_for_matching"] = norm_name
         normalized_ingredients.append(norm_name)
         parsed_ingredients_details.append(parsed)
-        # on vérifie si le nom normalisé existe déjà dans ProductVector
-        existing_pv = db_sqla.query(ProductVector).filter(ProductVector.name == norm_name).first()
-        if not existing_pv:
-            # sinon, on le crée
-            new_pv = ProductVector(name=norm_name, name_vector=None, source="manual")
-            db_sqla.add(new_pv)
-            db_sqla.commit()
-            db_sqla.refresh(new_pv)
-            # on recalcul les liens entre les sources pour cet ingrédient
-            update_ingredient_links(
-                new_pv.id, # type: ignore
-                norm_name,
-                "manual",
-                find_similar_ingredients,
-                get_psycopg2_connection,
-                create_ingredient_link_table,
-                logger
-            )
-    recipe_dict = recipe_data.dict(by_alias=True)
+    # on crée en une seule requête les ProductVector manquants pour les ingrédients de la recette
+    new_pvs = create_missing_product_vectors(db_sqla, list(dict.fromkeys(normalized_ingredients)))
+    if new_pvs:
+        db_sqla.commit()
+        # les nouveaux ProductVector changent la correspondance exacte de ces noms d'ingrédients
+        clear_ingredient_details_cache()
+        # on vectorise les nouveaux ingrédients et on recalcule leurs liens entre les sources après l'envoi de la réponse
+        background_tasks.add_task(
+            update_ingredient_links_for_products,
+            [(new_pv_id, new_pv_name, "manual") for new_pv_id, new_pv_name in new_pvs],
+            find_similar_ingredients,
+            get_psycopg2_connection,
+            release_psycopg2_connection,
+            logger,
+            fill_vectors=True
+        )
+    recipe_dict = recipe_data.model_dump(by_alias=True)
     recipe_dict["normalized_ingredients"] = normalized_ingredients
     recipe_dict["parsed_ingredients_details"] = parsed_ingredients_details
     result = collection.insert_one(recipe_dict)
     mongo_id = str(result.inserted_id)
-    mongo_client.close()
     recipe_dict["id"] = mongo_id
     return recipe_dict
 
 @router.post(
     "/product",
     response_model=ProductCreationResponse,
+    status_code=status.HTTP_202_ACCEPTED,
     tags=["Updates"],
     summary="Create or update a product and its associated data",
-    description="Create or update a product (ProductVector) and its associated data (Agribalyse, OpenFoodFacts, Greenpeace) in a single request. Also updates ingredient similarity links.",
+    description="Create or update a product (ProductVector) and its associated data (Agribalyse, OpenFoodFacts, Greenpeace) in a single request. Ingredient similarity links are updated afterwards by a background job, whose status can be polled with GET /product/job/{job_id}.",
     response_description="Information about the created or updated product.",
     responses={
-        200: {
-            "description": "Product successfully created or updated.",
+        202: {
+            "description": "Product successfully created or updated; ingredient similarity links update accepted.",
             "content": {
                 "application/json": {
                     "example": {
@@ -131,7 +142,8 @@ async def create_recipe(
                         "name": "Apple",
                         "normalized_name": "apple",
                         "source": "agribalyse",
-                        "message": "Product data processed. Details: New ProductVector for 'apple' created with source 'agribalyse'. Ingredient similarity links update initiated."
+                        "message": "Product data processed. Details: New ProductVector for 'apple' created with source 'agribalyse'. Ingredient similarity links update initiated.",
+                        "job_id": "3f2b9c0e8d7a4b6c9e1f0a2b3c4d5e6f"
                     }
                 }
             }
@@ -140,101 +152,131 @@ async def create_recipe(
         500: {"description": "Server error during product creation or update."}
     }
 )
-async def create_product_endpoint(
+def create_product_endpoint(
     product_data: ProductCreate,
+    background_tasks: BackgroundTasks,
+    request: Request,
+    response: Response,
     db_sqla: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Create or update a product (ProductVector) and its associated data (Agribalyse, OpenFoodFacts, Greenpeace) in a single request.  
-    Also updates ingredient similarity links.  
+    Ingredient similarity links are updated in the background once the response has been sent: the response is 202 Accepted,  
+    with a job id (and a Location header) to poll the update status.  
     
     Args:  
         product_data (ProductCreate): The product data to create.  
+        background_tasks (BackgroundTasks): Tasks run after the response is sent (ingredient links update).  
+        request (Request): The incoming request, used to build the job status URL.  
+        response (Response): The response, used to set the Location header of the job.  
         db_sqla (Session): SQLAlchemy session dependency.  
         current_user (dict): Authenticated user info.  
     
     Returns:  
-        ProductCreationResponse: Information about the created or updated product.  
+        ProductCreationResponse: Information about the created or updated product, and the id of the links update job.  
     
     Raises:  
         HTTPException: If the product already exists or on server error.  
     """
     action_messages = []
     step_times = {}
-    start_time = time.perf_counter()
+    start_time = time.perf_counter() if logger.isEnabledFor(logging.DEBUG) else None
     logger.debug("[STEP] Start create_product_endpoint")
 
     logger.debug("[DEBUG] Step 1: Normalisation et validation du nom")
-    normalized_name = normalize_and_validate_name(product_data.name)
-    step_times['normalize_name'] = time.perf_counter() - start_time
-    logger.debug(f"[STEP] normalize_name done in {step_times['normalize_name']:.4f}s")
+    with _timed_step(step_times, 'normalize_name'):
+        normalized_name = normalize_and_validate_name(product_data.name)
 
     logger.debug("[DEBUG] Step 2: Sélection ou création du ProductVector")
-    step_start = time.perf_counter()
-    pv_to_process, effective_source, action_messages_pv = select_or_create_product_vector(db_sqla, normalized_name, product_data)
+    with _timed_step(step_times, 'select_or_create_pv'):
+        pv_to_process, effective_source, action_messages_pv, is_new_pv = select_or_create_product_vector(db_sqla, normalized_name, product_data)
     action_messages.extend(action_messages_pv)
-    step_times['select_or_create_pv'] = time.perf_counter() - step_start
-    logger.debug(f"[STEP] select_or_create_pv done in {step_times['select_or_create_pv']:.4f}s")
 
     try:
-        logger.debug("[DEBUG] Step 3: Flush DB session")
-        step_start = time.perf_counter()
-        db_sqla.flush()
-        step_times['flush'] = time.perf_counter() - step_start
-        logger.debug(f"[STEP] flush done in {step_times['flush']:.4f}s")
-
-        logger.debug("[DEBUG] Step 4: Traitement Agribalyse")
-        step_start = time.perf_counter()
-        process_agribalyse_payload(db_sqla, pv_to_process, product_data, action_messages)
-        step_times['agribalyse'] = time.perf_counter() - step_start
-        logger.debug(f"[STEP] agribalyse done in {step_times['agribalyse']:.4f}s")
-
-        logger.debug("[DEBUG] Step 5: Traitement OpenFoodFacts")
-        step_start = time.perf_counter()
-        process_openfoodfacts_payload(db_sqla, pv_to_process, product_data, action_messages)
-        step_times['openfoodfacts'] = time.perf_counter() - step_start
-        logger.debug(f"[STEP] openfoodfacts done in {step_times['openfoodfacts']:.4f}s")
-
-        logger.debug("[DEBUG] Step 6: Traitement Greenpeace")
-        step_start = time.perf_counter()
-        process_greenpeace_payload(db_sqla, pv_to_process, product_data, action_messages)
-        step_times['greenpeace'] = time.perf_counter() - step_start
-        logger.debug(f"[STEP] greenpeace done in {step_times['greenpeace']:.4f}s")
-
-        logger.debug("[DEBUG] Step 7: Commit et refresh DB")
-        step_start = time.perf_counter()
-        commit_and_refresh(db_sqla, pv_to_process)
-        step_times['commit_refresh'] = time.perf_counter() - step_start
-        logger.debug(f"[STEP] commit_refresh done in {step_times['commit_refresh']:.4f}s")
+        logger.debug("[DEBUG] Step 3: Traitement Agribalyse")
+        with _timed_step(step_times, 'agribalyse'):
+            if product_data.agribalyse_payload:
+                process_agribalyse_payload(db_sqla, pv_to_process, product_data, action_messages, is_new_pv)
+
+        logger.debug("[DEBUG] Step 4: Traitement OpenFoodFacts")
+        with _timed_step(step_times, 'openfoodfacts'):
+            if product_data.openfoodfacts_payload:
+                process_openfoodfacts_payload(db_sqla, pv_to_process, product_data, action_messages, is_new_pv)
+
+        logger.debug("[DEBUG] Step 5: Traitement Greenpeace")
+        with _timed_step(step_times, 'greenpeace'):
+            if product_data.greenpeace_payload:
+                process_greenpeace_payload(db_sqla, pv_to_process, product_data, action_messages, is_new_pv)
+
+        logger.debug("[DEBUG] Step 6: Commit de la transaction")
+        with _timed_step(step_times, 'commit'):
+            # le job est enregistré dans la même transaction que le produit
+            job_id = create_product_job(db_sqla, pv_to_process)
+            product_vector_id = commit_product_vector(db_sqla, pv_to_process)
     except Exception as e:
         db_sqla.rollback()
         logger.error(f"Error during product database insertion: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to save product data: {str(e)}")
 
-    product_vector_id = pv_to_process.id
     if not isinstance(product_vector_id, int) or product_vector_id is None:
         logger.error("Invalid product_vector_id: must be a non-None integer")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Invalid product_vector_id generated.")
 
-    logger.debug("[DEBUG] Step 8: Mise à jour des liens d'ingrédients")
-    update_ingredient_links(
+    logger.debug("[DEBUG] Step 7: Mise à jour des liens d'ingrédients (après l'envoi de la réponse)")
+    background_tasks.add_task(
+        update_ingredient_links,
         product_vector_id,
         normalized_name,
         effective_source,
         find_similar_ingredients,
         get_psycopg2_connection,
-        create_ingredient_link_table,
-        logger
+        release_psycopg2_connection,
+        logger,
+        job_id=job_id
     )
+    response.headers["Location"] = str(request.url_for("get_product_job", job_id=job_id))
 
-    total_time = time.perf_counter() - start_time
-    logger.debug(f"[STEP] create_product_endpoint finished in {total_time:.4f}s. Step breakdown: {step_times}")
+    if start_time is not None:
+        logger.debug("[STEP] create_product_endpoint finished in %.4fs. Step breakdown: %s", time.perf_counter() - start_time, step_times)
 
     return ProductCreationResponse(
         product_vector_id=product_vector_id, # type: ignore
         name=product_data.name,
         normalized_name=normalized_name,
         source=effective_source,
-        message="Product data processed. Details: " + " | ".join(action_messages) + ". Ingredient similarity links update initiated."
+        message="Product data processed. Details: " + " | ".join(action_messages) + ". Ingredient similarity links update initiated.",
+        job_id=job_id
     )
+
+@router.get(
+    "/product/job/{job_id}",
+    response_model=ProductJobStatus,
+    tags=["Updates"],
+    summary="Get the status of an ingredient links update job",
+    description="Retrieve the status (pending, done or failed) of the ingredient similarity links update started by POST /product.",
+    responses={404: {"description": "Job not found."}}
+)
+def get_product_job(
+    job_id: str,
+    db_sqla: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get the status of an ingredient similarity links update job.  
+    
+    Args:  
+        job_id (str): The job id returned by POST /product.  
+        db_sqla (Session): SQLAlchemy session dependency.  
+        current_user (dict): Authenticated user info.  
+    
+    Returns:  
+        ProductJobStatus: The status and message of the job.  
+    
+    Raises:  
+        HTTPException: If the job does not exist.  
+    """
+    job = db_sqla.get(ProductJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return ProductJobStatus(job_id=job.job_id, product_vector_id=job.product_vector_id, status=job.status, message=job.message) # type: ignore
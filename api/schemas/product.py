@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field
 from typing import List, Optional, Literal
 
 class AgribalyseProductData(BaseModel):
@@ -72,14 +72,14 @@ class GreenpeaceProductData(BaseModel):
     Données spécifiques Greenpeace pour un produit.
     'name' provient du champ principal 'name'.
     """
-    months: List[str] = Field(..., example=["janvier", "février"], description="Liste des mois où le produit est de saison") # type: ignore
+    months: List[str] = Field(..., examples=[["janvier", "février"]], description="Liste des mois où le produit est de saison")
 
 class ProductCreate(BaseModel):
     """
     Modèle de création d'un produit.
     Le champ 'name' est obligatoire et représente le nom commun du produit.
     """
-    name: str = Field(..., example="Pomme de terre", description="Nom commun du produit.") # type: ignore
+    name: str = Field(..., examples=["Pomme de terre"], description="Nom commun du produit.")
     agribalyse_payload: Optional[AgribalyseProductData] = None
     openfoodfacts_payload: Optional[OpenFoodFactsProductData] = None
     greenpeace_payload: Optional[GreenpeaceProductData] = None
@@ -93,3 +93,13 @@ class ProductCreationResponse(BaseModel):
     normalized_name: str
     source: str
     message: str
+    job_id: str = Field(..., description="Identifiant du job de mise à jour des liens d'ingrédients, à suivre via GET /product/job/{job_id}.")
+
+class ProductJobStatus(BaseModel):
+    """
+    Modèle de réponse de l'état d'un job de mise à jour des liens d'ingrédients.
+    """
+    job_id: str
+    product_vector_id: Optional[int] = None
+    status: Literal["pending", "done", "failed"]
+    message: Optional[str] = None
@@ -1,7 +1,9 @@
 import os
+import threading
+from psycopg2.pool import ThreadedConnectionPool
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session as SQLAlchemySession
-from typing import Generator
+from typing import Generator, Optional
 from api.sql_models import Base
 
 POSTGRES_USER = os.getenv('POSTGRES_USER', 'postgres')
@@ -10,10 +12,78 @@ POSTGRES_HOST = os.getenv('POSTGRES_HOST', 'localhost')
 POSTGRES_PORT = os.getenv('POSTGRES_PORT', '5432')
 POSTGRES_DB = os.getenv('POSTGRES_DB', 'postgres')
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+SQLALCHEMY_DATABASE_URL = f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# les routes synchrones sont exécutées dans le threadpool de FastAPI : le pool doit suivre la concurrence
+PG_POOL_SIZE = int(os.getenv('PG_POOL_SIZE', '20'))
+PG_MAX_OVERFLOW = int(os.getenv('PG_MAX_OVERFLOW', '10'))
+PG_POOL_RECYCLE = int(os.getenv('PG_POOL_RECYCLE', '1800'))
+# délai d'attente d'une connexion libre quand le pool est saturé, avant de lever une erreur
+PG_POOL_TIMEOUT = int(os.getenv('PG_POOL_TIMEOUT', '30'))
+
+# pool_pre_ping écarte les connexions coupées pendant une période d'inactivité, pool_recycle les renouvelle périodiquement
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    pool_size=PG_POOL_SIZE,
+    max_overflow=PG_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=PG_POOL_RECYCLE,
+    pool_timeout=PG_POOL_TIMEOUT
+)
+# expire_on_commit=False : les objets restent lisibles après commit sans SELECT de rechargement
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+PSYCOPG2_POOL_MINCONN = int(os.getenv('PSYCOPG2_POOL_MINCONN', '2'))
+PSYCOPG2_POOL_MAXCONN = int(os.getenv('PSYCOPG2_POOL_MAXCONN', '20'))
+
+_psycopg2_pool: Optional[ThreadedConnectionPool] = None
+_psycopg2_pool_lock = threading.Lock()
+
+def _get_psycopg2_pool() -> ThreadedConnectionPool:
+    """
+    Retourne le pool de connexions psycopg2 partagé, en le créant au premier appel.
+
+    Returns:
+        ThreadedConnectionPool: Le pool de connexions psycopg2.
+    """
+    global _psycopg2_pool
+    if _psycopg2_pool is None:
+        with _psycopg2_pool_lock:
+            if _psycopg2_pool is None:
+                _psycopg2_pool = ThreadedConnectionPool(
+                    PSYCOPG2_POOL_MINCONN,
+                    PSYCOPG2_POOL_MAXCONN,
+                    dbname=POSTGRES_DB,
+                    user=POSTGRES_USER,
+                    password=POSTGRES_PASSWORD,
+                    host=POSTGRES_HOST,
+                    port=POSTGRES_PORT
+                )
+    return _psycopg2_pool
+
+def get_psycopg2_connection():
+    """
+    Emprunte une connexion psycopg2 au pool partagé, pour les traitements qui utilisent des requêtes SQL brutes.
+    La connexion doit être rendue avec release_psycopg2_connection.
+
+    Returns:
+        psycopg2.extensions.connection: Connexion à la base de données.
+    """
+    return _get_psycopg2_pool().getconn()
+
+def release_psycopg2_connection(conn) -> None:
+    """
+    Rend une connexion psycopg2 au pool partagé, en annulant une éventuelle transaction restée ouverte.
+
+    Args:
+        conn (psycopg2.extensions.connection): La connexion empruntée avec get_psycopg2_connection.
+    """
+    pool = _get_psycopg2_pool()
+    if conn.closed:
+        pool.putconn(conn, close=True)
+        return
+    conn.rollback()
+    pool.putconn(conn)
 
 def init_db():
     """
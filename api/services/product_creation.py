@@ -1,13 +1,28 @@
-from typing import Optional, Tuple, List, Dict
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple, List, Dict
+from sqlalchemy import Text, case, column, func, insert, update, select, exists, literal, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 import logging
 import time
-from api.sql_models import ProductVector, Agribalyse, OpenFoodFacts, GreenpeaceSeason
-from processing.utils import normalize_name, vectorize_name
+from uuid import uuid4
+from psycopg2.extras import execute_values
+from api.sql_models import ProductVector, Agribalyse, OpenFoodFacts, GreenpeaceSeason, ProductJob
+from api.services.product_query_helper import clear_ingredient_details_cache
+from api.services.db_session import SessionLocal
+from processing.utils import normalize_name, vectorize_name, vectorize_names
+from processing.build_ingredient_links import refresh_ingredient_name_links
 
 logger = logging.getLogger(__name__)
 
+# colonnes des tables sources pouvant être renseignées depuis les payloads
+AGRIBALYSE_UPDATABLE_FIELDS = frozenset(c.key for c in Agribalyse.__table__.columns) - {"id", "product_vector_id"}
+OPENFOODFACTS_UPDATABLE_FIELDS = frozenset(c.key for c in OpenFoodFacts.__table__.columns) - {"id", "product_vector_id"}
+# champs des payloads dont le nom diffère de la colonne correspondante
+AGRIBALYSE_FIELD_RENAMES = MappingProxyType({"nom_produit_francais_agb": "nom_produit_francais"})
+OPENFOODFACTS_FIELD_RENAMES = MappingProxyType({"product_name_off": "product_name", "code_off": "code"})
+
 def normalize_and_validate_name(product_name: str) -> str:
     """
     Normalise et valide le nom du produit.
@@ -27,7 +42,7 @@ def normalize_and_validate_name(product_name: str) -> str:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Normalized product name cannot be empty after processing.")
     return normalized_name
 
-def select_or_create_product_vector(db_sqla: Session, normalized_name: str, product_data) -> Tuple[ProductVector, str, List[str]]:
+def select_or_create_product_vector(db_sqla: Session, normalized_name: str, product_data) -> Tuple[ProductVector, str, List[str], bool]:
     """
     Sélectionne ou crée un ProductVector basé sur le nom normalisé et les données du produit.
 
@@ -40,53 +55,44 @@ def select_or_create_product_vector(db_sqla: Session, normalized_name: str, prod
         HTTPException: Si le produit existe déjà.
 
     Returns:
-        Tuple[ProductVector, str, List[str]]: Le ProductVector à traiter, la source effective et les messages d'action.
+        Tuple[ProductVector, str, List[str], bool]: Le ProductVector à traiter, la source effective, les messages d'action
+        et un booléen indiquant si le ProductVector vient d'être créé (aucune entrée liée ne peut alors exister).
     """
     action_messages = []
     effective_source = None
     pv_to_process = None
-    # on vérifie si des ProductVector existent déjà pour ce nom
-    existing_pvs = db_sqla.query(ProductVector).filter(ProductVector.name == normalized_name).all()
-    if existing_pvs:
-        if len(existing_pvs) == 1:
+    is_new_pv = False
+    # sources à privilégier si plusieurs ProductVector portent ce nom, dans l'ordre des payloads fournis
+    preferred_sources = [
+        pv_source for pv_source, payload in (
+            ("agribalyse", product_data.agribalyse_payload),
+            ("openfoodfacts", product_data.openfoodfacts_payload),
+            ("greenpeace", product_data.greenpeace_payload),
+        ) if payload
+    ]
+    # on récupère une seule ligne, choisie par PostgreSQL, avec le nombre total de ProductVector pour ce nom
+    existing_pv_query = db_sqla.query(ProductVector, func.count().over()).filter(ProductVector.name == normalized_name)
+    if preferred_sources:
+        existing_pv_query = existing_pv_query.order_by(
+            case({pv_source: rank for rank, pv_source in enumerate(preferred_sources)}, value=ProductVector.source, else_=len(preferred_sources))
+        )
+    existing_pv = existing_pv_query.order_by(ProductVector.id).limit(1).first()
+    if existing_pv:
+        pv_to_process, existing_pv_count = existing_pv
+        if existing_pv_count == 1:
             # Si un seul ProductVector existe, on le sélectionne
-            pv_to_process = existing_pvs[0]
             action_messages.append(f"Found existing ProductVector for '{normalized_name}' (ID: {pv_to_process.id}, Source: {pv_to_process.source}).")
+        elif pv_to_process.source in preferred_sources:
+            # Si on a trouvé un ProductVector correspondant à une des sources fournies, on l'utilise
+            action_messages.append(f"Multiple ProductVectors found for '{normalized_name}'. Selected existing PV (ID: {pv_to_process.id}, Source: {pv_to_process.source}) based on provided payloads.")
         else:
-            # Si plusieurs ProductVector existent, on doit choisir lequel utiliser, en fonction des données fournies
-            selected_pv = None
-            if product_data.agribalyse_payload:
-                for pv in existing_pvs:
-                    if getattr(pv, 'source', None) == "agribalyse":
-                        selected_pv = pv
-                        break
-            if not selected_pv and product_data.openfoodfacts_payload:
-                for pv in existing_pvs:
-                    if getattr(pv, 'source', None) == "openfoodfacts":
-                        selected_pv = pv
-                        break
-            if not selected_pv and product_data.greenpeace_payload:
-                for pv in existing_pvs:
-                    if getattr(pv, 'source', None) == "greenpeace":
-                        selected_pv = pv
-                        break
-            if selected_pv:
-                # Si on a trouvé un ProductVector correspondant à une des sources fournies, on l'utilise
-                pv_to_process = selected_pv
-                action_messages.append(f"Multiple ProductVectors found for '{normalized_name}'. Selected existing PV (ID: {pv_to_process.id}, Source: {pv_to_process.source}) based on provided payloads.")
-            else:
-                # Si aucun ProductVector ne correspond aux sources fournies, on utilise le premier
-                pv_to_process = existing_pvs[0]
-                action_messages.append(f"Multiple ProductVectors found for '{normalized_name}'. Defaulting to the first one (ID: {pv_to_process.id}, Source: {pv_to_process.source}).")
+            # Si aucun ProductVector ne correspond aux sources fournies, on utilise le premier
+            action_messages.append(f"Multiple ProductVectors found for '{normalized_name}'. Defaulting to the first one (ID: {pv_to_process.id}, Source: {pv_to_process.source}).")
         effective_source = getattr(pv_to_process, 'source', '') or ''
     else:
-        # Si aucun ProductVector n'existe, on en crée un nouveau
-        if product_data.agribalyse_payload:
-            effective_source = "agribalyse"
-        elif product_data.openfoodfacts_payload:
-            effective_source = "openfoodfacts"
-        elif product_data.greenpeace_payload:
-            effective_source = "greenpeace"
+        # Si aucun ProductVector n'existe, on en crée un nouveau, avec la source du premier payload fourni
+        if preferred_sources:
+            effective_source = preferred_sources[0]
         else:
             logger.error("[STEP] No data payload provided for new product.")
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Cannot create a new product without at least one data payload (Agribalyse, OpenFoodFacts, or Greenpeace).")
@@ -98,102 +104,137 @@ def select_or_create_product_vector(db_sqla: Session, normalized_name: str, prod
         )
         db_sqla.add(new_pv_entry)
         pv_to_process = new_pv_entry
+        is_new_pv = True
         action_messages.append(f"New ProductVector for '{normalized_name}' created with source '{effective_source}'.")
-    return pv_to_process, effective_source, action_messages
+    return pv_to_process, effective_source, action_messages, is_new_pv
 
-def process_agribalyse_payload(db_sqla: Session, pv_to_process: ProductVector, product_data, action_messages: List[str]):
+def _payload_to_columns(payload_data: Dict, renames: Mapping[str, str], columns: frozenset) -> Dict:
+    """
+    Convertit les champs d'un payload en valeurs de colonnes de la table source correspondante.
+
+    Args:
+        payload_data (Dict): Les champs renseignés du payload.
+        renames (Mapping[str, str]): Les champs du payload à renommer vers leur colonne.
+        columns (frozenset): Les colonnes pouvant être renseignées.
+
+    Returns:
+        Dict: Les valeurs à écrire, par nom de colonne.
+    """
+    values = {}
+    for key, value in payload_data.items():
+        column = renames.get(key, key)
+        if column in columns:
+            values[column] = value
+    return values
+
+def _upsert_source_entry(db_sqla: Session, model, product_vector_id: int, values: Dict) -> bool:
+    """
+    Met à jour la première entrée d'une table source (Agribalyse, OpenFoodFacts) liée au ProductVector,
+    ou la crée si elle n'existe pas, en une seule requête.
+    Les tables sources n'ont pas de contrainte d'unicité sur product_vector_id (les données importées peuvent
+    contenir plusieurs lignes par produit), d'où un UPDATE dans une CTE suivi d'un INSERT conditionnel
+    plutôt qu'un INSERT ... ON CONFLICT.
+
+    Args:
+        db_sqla (Session): La session SQLAlchemy.
+        model: Le modèle SQLAlchemy de la table source.
+        product_vector_id (int): L'ID du ProductVector.
+        values (Dict): Les valeurs des colonnes à écrire.
+
+    Returns:
+        bool: True si l'entrée a été créée, False si une entrée existante a été mise à jour.
+    """
+    existing_id = select(model.id).where(model.product_vector_id == product_vector_id).order_by(model.id).limit(1).scalar_subquery()
+    updated = update(model).where(model.id == existing_id).values(**values).returning(model.id).cte("updated_entry")
+    row = {"product_vector_id": product_vector_id, **values}
+    columns = model.__table__.c
+    new_row = select(*[literal(v, type_=columns[k].type) for k, v in row.items()]).where(~exists(select(updated.c.id)))
+    stmt = insert(model).from_select(list(row), new_row).returning(model.id).add_cte(updated)
+    return db_sqla.execute(stmt).first() is not None
+
+def process_agribalyse_payload(db_sqla: Session, pv_to_process: ProductVector, product_data, action_messages: List[str], is_new_pv: bool = False):
     """
     Traite les données de payload Agribalyse et met à jour ou crée l'entrée correspondante.
+    À n'appeler que si product_data.agribalyse_payload est renseigné (vérifié par l'endpoint).
 
     Args:
         db_sqla (Session): La session SQLAlchemy.
         pv_to_process (ProductVector): Le ProductVector à traiter.
         product_data (AgribalyseProductData): Les données du produit.
         action_messages (List[str]): Les messages d'action à mettre à jour.
+        is_new_pv (bool): True si le ProductVector vient d'être créé : les requêtes sur les entrées existantes sont alors évitées.
     """
-    if product_data.agribalyse_payload:
-        ag_payload_data = product_data.agribalyse_payload.dict(exclude_unset=True)
-        ag_name = product_data.agribalyse_payload.nom_produit_francais_agb or product_data.name
-        ag_code = product_data.agribalyse_payload.code_agb
-        ag_entry = db_sqla.query(Agribalyse).filter_by(product_vector_id=pv_to_process.id).first()
-        if ag_entry:
-            setattr(ag_entry, 'nom_produit_francais', ag_name)
-            setattr(ag_entry, 'code_agb', ag_code)
-            for key, value in ag_payload_data.items():
-                if hasattr(ag_entry, key) and key not in ["nom_produit_francais_agb", "code_agb"]:
-                    setattr(ag_entry, key, value)
-            action_messages.append("Agribalyse data updated.")
-        else:
-            new_ag_entry = Agribalyse(
-                product_vector_id=pv_to_process.id,
-                nom_produit_francais=ag_name,
-                code_agb=ag_code,
-                **{k: v for k, v in ag_payload_data.items() if k not in ["nom_produit_francais_agb", "code_agb"]}
-            )
-            db_sqla.add(new_ag_entry)
-            action_messages.append("Agribalyse data created.")
+    ag_payload_data = product_data.agribalyse_payload.model_dump(exclude_unset=True)
+    values = _payload_to_columns(ag_payload_data, AGRIBALYSE_FIELD_RENAMES, AGRIBALYSE_UPDATABLE_FIELDS)
+    values["nom_produit_francais"] = product_data.agribalyse_payload.nom_produit_francais_agb or product_data.name
+    values["code_agb"] = product_data.agribalyse_payload.code_agb
+    if is_new_pv:
+        # ProductVector pas encore inséré : l'entrée est rattachée par la relation et insérée avec lui au commit
+        pv_to_process.agribalyse_entries.append(Agribalyse(**values))
+        action_messages.append("Agribalyse data created.")
+    elif _upsert_source_entry(db_sqla, Agribalyse, pv_to_process.id, values): # type: ignore
+        action_messages.append("Agribalyse data created.")
+    else:
+        action_messages.append("Agribalyse data updated.")
 
-def process_openfoodfacts_payload(db_sqla: Session, pv_to_process: ProductVector, product_data, action_messages: List[str]):
+def process_openfoodfacts_payload(db_sqla: Session, pv_to_process: ProductVector, product_data, action_messages: List[str], is_new_pv: bool = False):
     """
     Traite les données de payload OpenFoodFacts et met à jour ou crée l'entrée correspondante.
-
+    À n'appeler que si product_data.openfoodfacts_payload est renseigné (vérifié par l'endpoint).
 
     Args:
         db_sqla (Session): La session SQLAlchemy.
         pv_to_process (ProductVector): Le ProductVector à traiter.
         product_data (OpenFoodFactsProductData): Les données du produit.
         action_messages (List[str]): Les messages d'action à mettre à jour.
+        is_new_pv (bool): True si le ProductVector vient d'être créé : les requêtes sur les entrées existantes sont alors évitées.
     """
-    if product_data.openfoodfacts_payload:
-        off_payload_data = product_data.openfoodfacts_payload.dict(exclude_unset=True)
-        off_name = product_data.openfoodfacts_payload.product_name_off or product_data.name
-        off_code = product_data.openfoodfacts_payload.code_off
-        off_entry = db_sqla.query(OpenFoodFacts).filter_by(product_vector_id=pv_to_process.id).first()
-        if off_entry:
-            setattr(off_entry, 'product_name', off_name)
-            setattr(off_entry, 'code', off_code)
-            for key, value in off_payload_data.items():
-                if hasattr(off_entry, key) and key not in ["product_name_off", "code_off"]:
-                    setattr(off_entry, key, value)
-            action_messages.append("OpenFoodFacts data updated.")
-        else:
-            new_off_entry = OpenFoodFacts(
-                product_vector_id=pv_to_process.id,
-                product_name=off_name,
-                code=off_code,
-                **{k: v for k, v in off_payload_data.items() if k not in ["product_name_off", "code_off"]}
-            )
-            db_sqla.add(new_off_entry)
-            action_messages.append("OpenFoodFacts data created.")
+    off_payload_data = product_data.openfoodfacts_payload.model_dump(exclude_unset=True)
+    values = _payload_to_columns(off_payload_data, OPENFOODFACTS_FIELD_RENAMES, OPENFOODFACTS_UPDATABLE_FIELDS)
+    values["product_name"] = product_data.openfoodfacts_payload.product_name_off or product_data.name
+    values["code"] = product_data.openfoodfacts_payload.code_off
+    if is_new_pv:
+        # ProductVector pas encore inséré : l'entrée est rattachée par la relation et insérée avec lui au commit
+        pv_to_process.openfoodfacts_entries.append(OpenFoodFacts(**values))
+        action_messages.append("OpenFoodFacts data created.")
+    elif _upsert_source_entry(db_sqla, OpenFoodFacts, pv_to_process.id, values): # type: ignore
+        action_messages.append("OpenFoodFacts data created.")
+    else:
+        action_messages.append("OpenFoodFacts data updated.")
 
-def process_greenpeace_payload(db_sqla: Session, pv_to_process: ProductVector, product_data, action_messages: List[str]):
+def process_greenpeace_payload(db_sqla: Session, pv_to_process: ProductVector, product_data, action_messages: List[str], is_new_pv: bool = False):
     """
     Traite les données de payload Greenpeace et met à jour ou crée les entrées correspondantes.
+    À n'appeler que si product_data.greenpeace_payload est renseigné (vérifié par l'endpoint).
 
     Args:
         db_sqla (Session): La session SQLAlchemy.
         pv_to_process (ProductVector): Le ProductVector à traiter.
         product_data (GreenpeaceProductData): Les données du produit.
         action_messages (List[str]): Les messages d'action à mettre à jour.
+        is_new_pv (bool): True si le ProductVector vient d'être créé : les requêtes sur les entrées existantes sont alors évitées.
     """
-    if product_data.greenpeace_payload:
-        existing_gp_entries = db_sqla.query(GreenpeaceSeason).filter_by(product_vector_id=pv_to_process.id).all()
-        for entry in existing_gp_entries:
-            db_sqla.delete(entry)
-        if product_data.greenpeace_payload.months:
-            for month in product_data.greenpeace_payload.months:
-                new_gp_entry = GreenpeaceSeason(
-                    product_vector_id=pv_to_process.id,
-                    month=month
-                )
-                db_sqla.add(new_gp_entry)
-            action_messages.append("Greenpeace seasonality data updated.")
-        else:
-            action_messages.append("Greenpeace seasonality data cleared (empty month list provided).")
+    months = product_data.greenpeace_payload.months
+    if is_new_pv:
+        # ProductVector pas encore inséré : aucun mois à supprimer, les nouveaux sont insérés avec lui au commit
+        pv_to_process.greenpeace_season_entries.extend(GreenpeaceSeason(month=month) for month in months)
+    else:
+        # un seul DELETE pour tous les mois existants, puis un seul INSERT multi-lignes pour les nouveaux
+        db_sqla.query(GreenpeaceSeason).filter_by(product_vector_id=pv_to_process.id).delete(synchronize_session=False)
+        if months:
+            db_sqla.execute(
+                insert(GreenpeaceSeason),
+                [{"product_vector_id": pv_to_process.id, "month": month} for month in months]
+            )
+    if months:
+        action_messages.append("Greenpeace seasonality data updated.")
+    else:
+        action_messages.append("Greenpeace seasonality data cleared (empty month list provided).")
 
-def commit_and_refresh(db_sqla: Session, pv_to_process: ProductVector):
+def commit_product_vector(db_sqla: Session, pv_to_process: ProductVector) -> int:
     """
-    Commit les changements dans la base de données et rafraîchit l'objet ProductVector.
+    Commit en une seule transaction le ProductVector et ses entrées liées, et retourne l'ID du ProductVector.
+    L'ID est lu juste après le flush, avant le commit : l'objet n'a pas besoin d'être rechargé après le commit.
 
     Args:
         db_sqla (Session): La session SQLAlchemy.
@@ -201,16 +242,152 @@ def commit_and_refresh(db_sqla: Session, pv_to_process: ProductVector):
 
     Raises:
         HTTPException: Si une erreur se produit lors de l'engagement des modifications.
+
+    Returns:
+        int: L'ID du ProductVector.
     """
     try:
+        db_sqla.flush()
+        product_vector_id = pv_to_process.id
         db_sqla.commit()
-        db_sqla.refresh(pv_to_process)
+        # les détails d'ingrédients en cache ne tiennent pas compte du produit créé ou mis à jour
+        clear_ingredient_details_cache()
+        return product_vector_id # type: ignore
     except Exception as e:
         db_sqla.rollback()
         logger.error(f"Error during product database insertion: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to save product data: {str(e)}")
 
-def update_ingredient_links(product_vector_id: int, normalized_name: str, effective_source: str, find_similar_ingredients, get_psycopg2_connection, create_ingredient_link_table, logger):
+def create_missing_product_vectors(db_sqla: Session, names: List[str], source: str = "manual") -> List[Tuple[int, str]]:
+    """
+    Crée, en une seule requête, un ProductVector pour chacun des noms normalisés absents de product_vector.
+    Les noms déjà présents (quelle que soit leur source) sont écartés par le WHERE NOT EXISTS de l'INSERT ... SELECT ;
+    un nom inséré entre-temps par une requête concurrente est ignoré par ON CONFLICT DO NOTHING sur
+    (name, source), au lieu de faire échouer l'insertion. Le commit est laissé à l'appelant.
+
+    Args:
+        db_sqla (Session): La session SQLAlchemy.
+        names (List[str]): Les noms normalisés, sans doublons.
+        source (str, optional): La source des ProductVector créés. Défaut à "manual".
+
+    Returns:
+        List[Tuple[int, str]]: L'ID et le nom de chaque ProductVector créé par cet appel. Les noms en conflit n'y
+            figurent pas : leurs liens sont mis à jour par la requête qui les a créés.
+    """
+    if not names:
+        return []
+    candidates = values(column("name", Text), name="candidate_names").data([(name,) for name in names])
+    new_rows = select(candidates.c.name, literal(source, type_=Text)).where(
+        ~exists().where(ProductVector.name == candidates.c.name)
+    )
+    stmt = (
+        pg_insert(ProductVector)
+        .from_select(["name", "source"], new_rows)
+        .on_conflict_do_nothing(constraint="uq_product_vector_name_source")
+        .returning(ProductVector.id, ProductVector.name)
+    )
+    return [(pv_id, pv_name) for pv_id, pv_name in db_sqla.execute(stmt).all()]
+
+def create_product_jobs_table(conn):
+    """
+    Crée la table 'product_jobs' si elle n'existe pas. Elle conserve l'état des mises à jour de liens lancées en arrière-plan.
+
+    Args:
+        conn (psycopg2.extensions.connection): Connexion à la base de données PostgreSQL.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS product_jobs (
+                job_id VARCHAR(32) PRIMARY KEY,
+                product_vector_id INTEGER REFERENCES product_vector(id) ON DELETE CASCADE,
+                status VARCHAR(16) NOT NULL DEFAULT 'pending',
+                message TEXT
+            );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS ix_product_jobs_product_vector_id ON product_jobs (product_vector_id);")
+    conn.commit()
+
+def create_product_job(db: Session, pv: ProductVector) -> str:
+    """
+    Enregistre un job 'pending' pour la mise à jour des liens du ProductVector, dans la transaction en cours.
+
+    Args:
+        db (Session): La session SQLAlchemy.
+        pv (ProductVector): Le ProductVector concerné (éventuellement pas encore inséré).
+    Returns:
+        str: L'identifiant du job.
+    """
+    job_id = uuid4().hex
+    # la relation renseigne product_vector_id au flush, y compris pour un ProductVector nouvellement créé
+    db.add(ProductJob(job_id=job_id, product_vector_item=pv, status="pending"))
+    return job_id
+
+def _set_product_job_status(cur, job_id: str, job_status: str, message: str):
+    """
+    Met à jour l'état d'un job de mise à jour des liens.
+
+    Args:
+        cur (psycopg2.extensions.cursor): Curseur PostgreSQL.
+        job_id (str): L'identifiant du job.
+        job_status (str): Le nouvel état ('done' ou 'failed').
+        message (str): Le message associé.
+    """
+    cur.execute("UPDATE product_jobs SET status = %s, message = %s WHERE job_id = %s;", (job_status, message, job_id))
+
+def _mark_product_job_failed(pg_conn, job_id: str, message: str, logger):
+    """
+    Passe un job de mise à jour des liens à 'failed', pour qu'il ne reste pas 'pending' indéfiniment.
+    Sans connexion psycopg2 utilisable (pool épuisé, base injoignable...), on passe par une session SQLAlchemy,
+    dont le pool de connexions est distinct.
+
+    Args:
+        pg_conn (psycopg2.extensions.connection): La connexion de la mise à jour, ou None si elle n'a pas pu être obtenue.
+        job_id (str): L'identifiant du job.
+        message (str): Le message associé.
+        logger: Le logger pour enregistrer les erreurs.
+    """
+    if pg_conn:
+        try:
+            pg_conn.rollback()
+            with pg_conn.cursor() as cur:
+                _set_product_job_status(cur, job_id, "failed", message)
+            pg_conn.commit()
+            return
+        except Exception as e_job:
+            logger.error(f"Error while marking job {job_id} as failed with the update connection: {e_job}", exc_info=True)
+    try:
+        with SessionLocal() as db:
+            job = db.get(ProductJob, job_id)
+            if job is not None:
+                job.status = "failed"
+                job.message = message
+                db.commit()
+    except Exception as e_job:
+        logger.error(f"Error while marking job {job_id} as failed: {e_job}", exc_info=True)
+
+def _refresh_ingredient_name_links(pg_conn, product_names: List[str], logger):
+    """
+    Met à jour 'ingredient_name_link' pour les nouveaux produits, dans sa propre transaction.
+    Appelée après le commit des liens : un échec est journalisé et annulé, sans toucher aux liens validés
+    ni à l'état du job.
+
+    Args:
+        pg_conn (psycopg2.extensions.connection): La connexion de la mise à jour des liens.
+        product_names (List[str]): Noms normalisés des produits ajoutés.
+        logger: Le logger pour enregistrer les erreurs.
+    """
+    try:
+        with pg_conn.cursor() as cur:
+            refresh_ingredient_name_links(cur, product_names)
+        pg_conn.commit()
+    except Exception as e_names:
+        logger.error(f"Error during ingredient name links refresh: {e_names}", exc_info=True)
+        try:
+            pg_conn.rollback()
+        except Exception as e_rollback:
+            logger.error(f"Error while rolling back the ingredient name links refresh: {e_rollback}", exc_info=True)
+
+def update_ingredient_links(product_vector_id: int, normalized_name: str, effective_source: str, find_similar_ingredients, get_psycopg2_connection, release_psycopg2_connection, logger, job_id: Optional[str] = None):
     """
     Met à jour les liens entre les ingrédients dans la base de données.
 
@@ -220,37 +397,96 @@ def update_ingredient_links(product_vector_id: int, normalized_name: str, effect
         effective_source (str): La source effective du produit.
         find_similar_ingredients: Fonction pour trouver des ingrédients similaires.
         get_psycopg2_connection: Fonction pour obtenir une connexion à la base de données PostgreSQL.
-        create_ingredient_link_table: Fonction pour créer la table de liens d'ingrédients si elle n'existe pas.
+        release_psycopg2_connection: Fonction pour rendre la connexion obtenue.
         logger: Le logger pour enregistrer les informations de débogage.
+        job_id (str, optional): Le job 'product_jobs' à passer à 'done' ou 'failed' à la fin de la mise à jour.
+
+    """
+    update_ingredient_links_for_products(
+        [(product_vector_id, normalized_name, effective_source)],
+        find_similar_ingredients,
+        get_psycopg2_connection,
+        release_psycopg2_connection,
+        logger,
+        job_id=job_id
+    )
+
+def fill_name_vectors(pg_conn, products: List[Tuple[int, str, str]]):
+    """
+    Calcule en un seul passage du modèle les vecteurs des noms de produits, et les enregistre en une seule requête.
+    Utilisé pour les ProductVector créés sans vecteur (ingrédients ajoutés par une recette).
 
+    Args:
+        pg_conn (psycopg2.extensions.connection): Connexion à la base de données PostgreSQL.
+        products (List[Tuple[int, str, str]]): Les produits à traiter (ID du ProductVector, nom normalisé, source effective).
+    """
+    vectors = vectorize_names([normalized_name for _, normalized_name, _ in products])
+    with pg_conn.cursor() as cur:
+        execute_values(cur, """
+            UPDATE product_vector SET name_vector = data.vec::vector
+            FROM (VALUES %s) AS data(id, vec)
+            WHERE product_vector.id = data.id;
+        """, [(product_vector_id, vector) for (product_vector_id, _, _), vector in zip(products, vectors)], page_size=500)
+
+def update_ingredient_links_for_products(products: List[Tuple[int, str, str]], find_similar_ingredients, get_psycopg2_connection, release_psycopg2_connection, logger, fill_vectors: bool = False, job_id: Optional[str] = None):
+    """
+    Met à jour les liens entre les ingrédients pour plusieurs produits, avec une seule connexion,
+    une seule insertion groupée de tous les liens et un seul commit. Les noms d'ingrédients précalculés
+    (ingredient_name_link) sont ensuite mis à jour dans une transaction séparée.
+    Permet de planifier une seule tâche de fond pour tous les ingrédients créés par une recette.
+
+    Args:
+        products (List[Tuple[int, str, str]]): Les produits à traiter (ID du ProductVector, nom normalisé, source effective).
+        find_similar_ingredients: Fonction pour trouver des ingrédients similaires.
+        get_psycopg2_connection: Fonction pour obtenir une connexion à la base de données PostgreSQL.
+        release_psycopg2_connection: Fonction pour rendre la connexion obtenue.
+        logger: Le logger pour enregistrer les informations de débogage.
+        fill_vectors (bool, optional): True si les produits ont été créés sans vecteur : ils sont vectorisés avant la recherche de similarité.
+        job_id (str, optional): Le job 'product_jobs' à passer à 'done' (dans la même transaction que les liens) ou 'failed'.
     """
-    import psycopg2
-    import time
-    step_times = {}
-    step_start = time.perf_counter()
+    step_start = time.perf_counter() if logger.isEnabledFor(logging.DEBUG) else None
     pg_conn = None
     try:
         pg_conn = get_psycopg2_connection()
         if pg_conn:
-            create_ingredient_link_table(pg_conn)
-            logger.debug(f"[STEP] Updating ingredient links for new product '{normalized_name}' (ID: {product_vector_id}, Source: {effective_source})")
-            # on cherche les ingrédients similaires à partir du nom normalisé
-            similars_from_new = find_similar_ingredients(normalized_name, effective_source, pg_conn)
-            logger.debug(f"[STEP] Found {len(similars_from_new)} similar ingredients from new product '{normalized_name}'")
+            if fill_vectors:
+                # sans vecteur, seule la similarité textuelle serait disponible pour ces produits
+                fill_name_vectors(pg_conn, products)
+            # la table ingredient_link est créée au démarrage de l'API (voir api.main.lifespan)
+            link_rows = []
+            for product_vector_id, normalized_name, effective_source in products:
+                logger.debug("[STEP] Updating ingredient links for new product '%s' (ID: %s, Source: %s)", normalized_name, product_vector_id, effective_source)
+                # on cherche les ingrédients similaires à partir du nom normalisé
+                similars_from_new = find_similar_ingredients(normalized_name, effective_source, pg_conn)
+                logger.debug("[STEP] Found %d similar ingredients from new product '%s'", len(similars_from_new), normalized_name)
+                link_rows.extend(
+                    (product_vector_id, effective_source, match_data['id'], other_src, match_data['score'])
+                    for other_src, match_data in similars_from_new.items()
+                )
             with pg_conn.cursor() as cur:
-                for other_src, match_data in similars_from_new.items():
-                    cur.execute("""
-                        INSERT INTO ingredient_link (id_source, source, id_linked, linked_source, score)
-                        VALUES (%s, %s, %s, %s, %s)
-                        ON CONFLICT (id_source, source, id_linked, linked_source) DO UPDATE SET score = EXCLUDED.score;
-                    """, (product_vector_id, effective_source, match_data['id'], other_src, match_data['score']))
+                # une seule requête multi-lignes pour tous les liens des produits
+                execute_values(cur, """
+                    INSERT INTO ingredient_link (id_source, source, id_linked, linked_source, score)
+                    VALUES %s
+                    ON CONFLICT (id_source, source, id_linked, linked_source) DO UPDATE SET score = EXCLUDED.score;
+                """, link_rows, template="(%s, %s, %s, %s, %s)", page_size=500)
+                if job_id:
+                    _set_product_job_status(cur, job_id, "done", f"{len(link_rows)} ingredient similarity links updated.")
             pg_conn.commit()
+            # les noms d'ingrédients précalculés proches des nouveaux produits doivent maintenant les inclure
+            _refresh_ingredient_name_links(pg_conn, [normalized_name for _, normalized_name, _ in products], logger)
+            # les détails d'ingrédients en cache ne tiennent pas compte des nouveaux produits et liens
+            clear_ingredient_details_cache()
         else:
             logger.error("Failed to get psycopg2 connection for ingredient link update.")
+            if job_id:
+                _mark_product_job_failed(None, job_id, "Ingredient similarity links update failed: no database connection.", logger)
     except Exception as e_links:
         logger.error(f"Error during ingredient link update: {e_links}", exc_info=True)
+        if job_id:
+            _mark_product_job_failed(pg_conn, job_id, "Ingredient similarity links update failed.", logger)
     finally:
         if pg_conn:
-            pg_conn.close()
-    step_times['ingredient_links'] = time.perf_counter() - step_start
-    logger.debug(f"[STEP] ingredient_links done in {step_times['ingredient_links']:.4f}s")
+            release_psycopg2_connection(pg_conn)
+    if step_start is not None:
+        logger.debug("[STEP] ingredient_links for %d products done in %.4fs", len(products), time.perf_counter() - step_start)
@@ -1,19 +1,87 @@
 import os
-import sys
-from time import time
-from typing import List, Optional, Dict, Any, Set
+import threading
+from operator import attrgetter
+from collections import OrderedDict
+from time import time, monotonic
+from typing import List, Optional, Dict, Any, Set, Tuple
 import pymongo # type: ignore
-from sqlalchemy.orm import Session
-from sqlalchemy import func, select, text, or_, and_, case
+from sqlalchemy.orm import Session, aliased, joinedload, load_only
+from sqlalchemy import Text, column, func, select, text, true, and_, case, literal, union_all, values
 from sqlalchemy.dialects.postgresql import ARRAY
 import logging
 logger = logging.getLogger(__name__)
 
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'processing'))
 from processing.utils import normalize_name, vectorize_name
 from processing.utils import DEFAULT_QUANTITY_GRAMS
-from api.sql_models import ProductVector, IngredientLink, Agribalyse, OpenFoodFacts, GreenpeaceSeason
+from processing.build_ingredient_links import INGREDIENT_NAME_LINK_MIN_SIMILARITY
+from processing.ingredient_similarity import VECTOR_WEIGHT, TRIGRAM_WEIGHT
+from api.sql_models import ProductVector, IngredientLink, IngredientNameLink, Agribalyse, OpenFoodFacts, GreenpeaceSeason
+
+# clés d'identification des produits, exclues de l'agrégation globale des détails
+EXCLUDED_KEYS_FOR_GLOBAL_DETAILS = frozenset({
+    'id', 'name', 'source', 'score_to_search', 'name_vector',
+    'product_name', 'code',
+    'nom_produit_francais', 'code_agb', 'code_ciqual', 'lci_name'
+})
+
+# champs nutritionnels et environnementaux (pour 100 g) sommés, pondérés par les quantités, sur les ingrédients d'une recette
+RECIPE_SUMMABLE_FIELDS = (
+    "energy_kcal_100g", "fat_100g", "saturated_fat_100g", "carbohydrates_100g",
+    "sugars_100g", "fiber_100g", "proteins_100g", "salt_100g", "sodium_100g",
+    "changement_climatique", "score_unique_ef", "ecotoxicite_eau_douce",
+    "epuisement_ressources_energetiques", "eutrophisation_marine",
+    "effets_tox_cancerogenes", "epuisement_ressources_eau", "eutrophisation_terrestre",
+    "utilisation_sol", "effets_tox_non_cancerogenes", "epuisement_ressources_mineraux",
+    "particules_fines", "formation_photochimique_ozone", "changement_climatique_biogenique",
+    "acidification_terrestre_eaux_douces", "changement_climatique_cas",
+    "appauvrissement_couche_ozone", "rayonnements_ionisants", "eutrophisation_eaux_douces",
+    "changement_climatique_fossile"
+)
+
+# colonnes des tables sources recopiées dans les détails d'un produit, calculées une seule fois au chargement du module
+_AGRIBALYSE_COLUMNS = tuple(col.name for col in Agribalyse.__table__.columns if col.name not in ('id', 'product_vector_id'))
+_OPENFOODFACTS_COLUMNS = tuple(col.name for col in OpenFoodFacts.__table__.columns if col.name not in ('id', 'product_vector_id'))
+_get_agribalyse_values = attrgetter(*_AGRIBALYSE_COLUMNS)
+_get_openfoodfacts_values = attrgetter(*_OPENFOODFACTS_COLUMNS)
+
+# nombre maximal d'IDs renvoyés par la recherche exacte sur le nom
+EXACT_NAME_MATCH_LIMIT = 50
+
+# cache, partagé entre les requêtes, des détails agrégés par ingrédient : clé (nom normalisé, score minimal des liens, score minimal du nom).
+# Le cache est propre à chaque processus : il n'est vidé que dans le processus qui modifie les produits ou leurs liens,
+# les autres workers (et les mises à jour faites par le pipeline) n'étant pris en compte qu'à l'expiration des entrées (TTL)
+INGREDIENT_DETAILS_CACHE_TTL = float(os.getenv("INGREDIENT_DETAILS_CACHE_TTL", "3600"))
+INGREDIENT_DETAILS_CACHE_MAXSIZE = int(os.getenv("INGREDIENT_DETAILS_CACHE_MAXSIZE", "10000"))
+_ingredient_details_cache: "OrderedDict[Tuple[str, float, float], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_ingredient_details_cache_lock = threading.Lock()
+
+
+def _trigram_match(name_column, search_name, min_name_similarity: float):
+    """
+    Construit le critère de similarité pg_trgm entre un nom et un terme de recherche, sous la forme de l'opérateur %,
+    seul utilisable par l'index GIN (name gin_trgm_ops) : similarity(...) >= seuil impose un parcours complet de la table.
+    Le seuil de l'opérateur est fixé pour la transaction en cours, par _set_trigram_similarity_threshold.
 
+    Args:
+        name_column: Colonne (ou expression) du nom à comparer.
+        search_name: Terme de recherche (valeur ou colonne).
+        min_name_similarity: Score de similarité de nom minimal.
+    Returns:
+        Le critère SQLAlchemy, ou None si le seuil est nul (tous les noms correspondent alors).
+    """
+    if min_name_similarity <= 0:
+        return None
+    return name_column.op('%')(search_name)
+
+def _set_trigram_similarity_threshold(db: Session, min_name_similarity: float):
+    """
+    Fixe le seuil de l'opérateur pg_trgm % pour la transaction en cours (équivalent de SET LOCAL).
+
+    Args:
+        db: Session SQLAlchemy.
+        min_name_similarity: Score de similarité de nom minimal.
+    """
+    db.execute(select(func.set_config('pg_trgm.similarity_threshold', str(min_name_similarity), True)))
 
 def _get_product_vector_ids_by_name(
     db: Session,
@@ -22,6 +90,7 @@ def _get_product_vector_ids_by_name(
 ) -> Set[int]:
     """
     Récupère les IDs de product_vector par similarité de nom.
+    Les correspondances exactes sur le nom sont renvoyées directement, sans recherche floue.
 
     Args:
         db: Session SQLAlchemy.
@@ -35,16 +104,112 @@ def _get_product_vector_ids_by_name(
 
     ids = set()
     try:
-        stmt = (
+        # si le nom existe tel quel, on évite le calcul de similarité pg_trgm (recherche par index btree)
+        exact_stmt = (
             select(ProductVector.id)
-            .where(func.similarity(ProductVector.name, normalized_name_search) >= min_name_similarity)
+            .where(ProductVector.name == normalized_name_search)
+            .limit(EXACT_NAME_MATCH_LIMIT)
         )
+        ids = set(db.execute(exact_stmt).scalars().all())
+        if ids:
+            return ids
+        stmt = select(ProductVector.id)
+        name_match = _trigram_match(ProductVector.name, normalized_name_search, min_name_similarity)
+        if name_match is not None:
+            _set_trigram_similarity_threshold(db, min_name_similarity)
+            stmt = stmt.where(name_match)
         result = db.execute(stmt).scalars().all()
         ids = set(result)
     except Exception as e:
         logger.error(f"Error in _get_product_vector_ids_by_name for '{normalized_name_search}': {e}")
+        db.rollback()
     return ids
 
+def _get_product_vector_ids_by_names(
+    db: Session,
+    normalized_names: Set[str],
+    min_name_similarity: float
+) -> Dict[str, Set[int]]:
+    """
+    Récupère les IDs de product_vector par similarité de nom pour plusieurs noms, en deux requêtes au plus.
+    Comme pour _get_product_vector_ids_by_name, les noms ayant une correspondance exacte ne passent pas par la recherche floue.
+
+    Args:
+        db: Session SQLAlchemy.
+        normalized_names: Noms normalisés à rechercher.
+        min_name_similarity: Score de similarité de nom minimal.
+    Returns:
+        Dict[str, Set[int]]: IDs de product_vector correspondants par nom (les noms sans correspondance sont absents).
+    """
+    ids_by_name: Dict[str, Set[int]] = {}
+    if not normalized_names:
+        return ids_by_name
+    try:
+        # correspondances exactes (index btree), limitées à EXACT_NAME_MATCH_LIMIT par nom
+        ranked_exact = (
+            select(ProductVector.name, ProductVector.id, func.row_number().over(partition_by=ProductVector.name).label("name_rank"))
+            .where(ProductVector.name.in_(normalized_names))
+            .subquery()
+        )
+        exact_stmt = select(ranked_exact.c.name, ranked_exact.c.id).where(ranked_exact.c.name_rank <= EXACT_NAME_MATCH_LIMIT)
+        for row in db.execute(exact_stmt):
+            ids_by_name.setdefault(row.name, set()).add(row.id)
+        names_without_exact_match = [name for name in normalized_names if name not in ids_by_name]
+        if not names_without_exact_match:
+            return ids_by_name
+        # recherche floue pg_trgm pour tous les noms restants en une seule requête
+        search_names = values(column("search_name", Text), name="search_names").data([(name,) for name in names_without_exact_match])
+        name_match = _trigram_match(ProductVector.name, search_names.c.search_name, min_name_similarity)
+        if name_match is not None:
+            _set_trigram_similarity_threshold(db, min_name_similarity)
+        else:
+            name_match = true()
+        fuzzy_stmt = select(search_names.c.search_name, ProductVector.id).join(ProductVector, name_match)
+        for row in db.execute(fuzzy_stmt):
+            ids_by_name.setdefault(row.search_name, set()).add(row.id)
+    except Exception as e:
+        logger.error(f"Error in _get_product_vector_ids_by_names for {len(normalized_names)} names: {e}")
+        db.rollback()
+    return ids_by_name
+
+def _get_precomputed_product_vector_ids(
+    db: Session,
+    normalized_names: Set[str],
+    min_name_similarity: float
+) -> Dict[str, Set[int]]:
+    """
+    Récupère en une requête les IDs de product_vector précalculés pour plusieurs noms d'ingrédients dans ingredient_name_link.
+
+    Args:
+        db: Session SQLAlchemy.
+        normalized_names: Noms d'ingrédients normalisés.
+        min_name_similarity: Score de similarité de nom minimal.
+    Returns:
+        Dict[str, Set[int]]: IDs correspondants par nom, pour les seuls noms précalculés. Les noms absents n'ont pas été
+        précalculés (ou le seuil demandé est inférieur à celui du précalcul) et doivent passer par la recherche floue.
+    """
+    ids_by_name: Dict[str, Set[int]] = {}
+    if not normalized_names or min_name_similarity < INGREDIENT_NAME_LINK_MIN_SIMILARITY:
+        return ids_by_name
+    try:
+        stmt = (
+            select(IngredientNameLink.normalized_name, IngredientNameLink.product_vector_id, IngredientNameLink.similarity)
+            .where(IngredientNameLink.normalized_name.in_(normalized_names))
+        )
+        rows = db.execute(stmt).all()
+    except Exception as e:
+        logger.error(f"Error in _get_precomputed_product_vector_ids for {len(normalized_names)} names: {e}")
+        # une requête en échec annule la transaction de la session : sans rollback, toutes les requêtes suivantes
+        # de la requête HTTP échoueraient aussi (par exemple si la table ingredient_name_link n'existe pas)
+        db.rollback()
+        return {}
+    for row in rows:
+        # un nom précalculé dont aucune correspondance n'atteint le seuil reste présent, avec un ensemble vide
+        ids = ids_by_name.setdefault(row.normalized_name, set())
+        if row.similarity >= min_name_similarity:
+            ids.add(row.product_vector_id)
+    return ids_by_name
+
 def _get_linked_product_vector_ids(
     db: Session,
     initial_ids: Set[int],
@@ -67,72 +232,49 @@ def _get_linked_product_vector_ids(
     best_links_per_initial_id: Dict[int, Dict[str, Any]] = {}
 
     try:
-        # on récupère les données des produits initiaux
-        initial_products_data_query = (
-            select(ProductVector.id, ProductVector.name, ProductVector.source, ProductVector.name_vector)
-            .where(ProductVector.id.in_(initial_ids))
+        # les liens sont stockés dans un seul sens : on réunit les deux sens, vus depuis le produit initial
+        # (direction sert à départager les ex aequo en faveur du sens id_source -> id_linked)
+        links_from_initial = (
+            select(
+                IngredientLink.id_source.label("initial_id"),
+                IngredientLink.id_linked.label("linked_id"),
+                IngredientLink.linked_source.label("linked_source"),
+                IngredientLink.score,
+                literal(0).label("direction")
+            )
+            .where(IngredientLink.id_source.in_(initial_ids), IngredientLink.score >= min_similarity_score)
         )
-        initial_products_results = db.execute(initial_products_data_query).all()
-        initial_products_data = {row.id: row for row in initial_products_results}
-
-        all_db_sources_query = select(ProductVector.source).distinct()
-        all_db_sources = [row[0] for row in db.execute(all_db_sources_query).all()]
-
-        for initial_pv_id, initial_product_info in initial_products_data.items():
-            # on itère sur chaque produit initial, et on cherche les meilleurs liens pour chaque source
-            current_initial_source = initial_product_info.source
-            best_links_for_current_initial: Dict[str, Any] = {}
-
-            for other_source_in_db in all_db_sources:
-                if other_source_in_db == current_initial_source:
-                    continue
-
-                stmt1 = (
-                    select(IngredientLink.id_linked, ProductVector.name.label("linked_name"), IngredientLink.score)
-                    .join(ProductVector, IngredientLink.id_linked == ProductVector.id)
-                    .where(
-                        IngredientLink.id_source == initial_pv_id,
-                        IngredientLink.linked_source == other_source_in_db,
-                        IngredientLink.score >= min_similarity_score
-                    )
-                    .order_by(IngredientLink.score.desc())
-                    .limit(1)
-                )
-
-                stmt2 = (
-                    select(IngredientLink.id_source.label("id_linked"), ProductVector.name.label("linked_name"), IngredientLink.score)
-                    .join(ProductVector, IngredientLink.id_source == ProductVector.id)
-                    .where(
-                        IngredientLink.id_linked == initial_pv_id,
-                        IngredientLink.source == other_source_in_db,
-                        IngredientLink.score >= min_similarity_score
-                    )
-                    .order_by(IngredientLink.score.desc())
-                    .limit(1)
-                )
-                # ces requêtes permettent de récupérer les produits les plus liés au produit initial via les liens d'ingrédients
-                res1 = db.execute(stmt1).first()
-                res2 = db.execute(stmt2).first()
-
-                best_match_for_source = None
-                if res1 and res2:
-                    best_match_for_source = res1 if res1.score >= res2.score else res2
-                elif res1:
-                    best_match_for_source = res1
-                elif res2:
-                    best_match_for_source = res2
-                
-                if best_match_for_source:
-                    best_links_for_current_initial[other_source_in_db] = {
-                        'id': best_match_for_source.id_linked,
-                        'name': best_match_for_source.linked_name,
-                        'score': best_match_for_source.score
-                    }
-            
-            if best_links_for_current_initial:
-                best_links_per_initial_id[initial_pv_id] = best_links_for_current_initial
+        links_to_initial = (
+            select(
+                IngredientLink.id_linked.label("initial_id"),
+                IngredientLink.id_source.label("linked_id"),
+                IngredientLink.source.label("linked_source"),
+                IngredientLink.score,
+                literal(1).label("direction")
+            )
+            .where(IngredientLink.id_linked.in_(initial_ids), IngredientLink.score >= min_similarity_score)
+        )
+        links = union_all(links_from_initial, links_to_initial).subquery("links")
+        initial_pv = aliased(ProductVector)
+        linked_pv = aliased(ProductVector)
+        # une seule requête : DISTINCT ON garde le meilleur lien de chaque produit initial vers chaque autre source
+        stmt = (
+            select(links.c.initial_id, links.c.linked_source, links.c.linked_id, linked_pv.name.label("linked_name"), links.c.score)
+            .join(initial_pv, initial_pv.id == links.c.initial_id)
+            .join(linked_pv, linked_pv.id == links.c.linked_id)
+            .where(links.c.linked_source != initial_pv.source)
+            .distinct(links.c.initial_id, links.c.linked_source)
+            .order_by(links.c.initial_id, links.c.linked_source, links.c.score.desc(), links.c.direction)
+        )
+        for row in db.execute(stmt):
+            best_links_per_initial_id.setdefault(row.initial_id, {})[row.linked_source] = {
+                'id': row.linked_id,
+                'name': row.linked_name,
+                'score': row.score
+            }
     except Exception as e:
         logger.error(f"Error in _get_linked_product_vector_ids for initial_ids {initial_ids}: {e}")
+        db.rollback()
     return best_links_per_initial_id
 
 
@@ -154,9 +296,16 @@ def _fetch_product_details(
 
     results = []
     try:
+        # les entrées des tables sources sont chargées par LEFT JOIN dans la même requête, en se limitant
+        # aux colonnes recopiées dans le résultat (jamais name_vector) ; un produit n'ayant qu'une source,
+        # les jointures ne multiplient que les lignes des mois de saison
         products = (
             db.query(ProductVector)
             .options(
+                load_only(ProductVector.id, ProductVector.name, ProductVector.source),
+                joinedload(ProductVector.agribalyse_entries),
+                joinedload(ProductVector.openfoodfacts_entries),
+                joinedload(ProductVector.greenpeace_season_entries).load_only(GreenpeaceSeason.month)
             )
             .filter(ProductVector.id.in_(list(product_vector_ids)))
             .all()
@@ -170,19 +319,9 @@ def _fetch_product_details(
             }
 
             if pv_item.source == 'agribalyse' and pv_item.agribalyse_entries: # type: ignore
-                ag_entry = pv_item.agribalyse_entries[0]
-                product_data.update({
-                    col.name: getattr(ag_entry, col.name)
-                    for col in Agribalyse.__table__.columns
-                    if col.name not in ['id', 'product_vector_id']
-                })
+                product_data.update(zip(_AGRIBALYSE_COLUMNS, _get_agribalyse_values(pv_item.agribalyse_entries[0])))
             elif pv_item.source == 'openfoodfacts' and pv_item.openfoodfacts_entries: # type: ignore
-                off_entry = pv_item.openfoodfacts_entries[0]
-                product_data.update({
-                    col.name: getattr(off_entry, col.name)
-                    for col in OpenFoodFacts.__table__.columns
-                    if col.name not in ['id', 'product_vector_id']
-                })
+                product_data.update(zip(_OPENFOODFACTS_COLUMNS, _get_openfoodfacts_values(pv_item.openfoodfacts_entries[0])))
             elif pv_item.source == 'greenpeace' and pv_item.greenpeace_season_entries: # type: ignore
                 months = [entry.month for entry in pv_item.greenpeace_season_entries]
                 if months:
@@ -192,44 +331,46 @@ def _fetch_product_details(
             
     except Exception as e:
         logger.error(f"Error in _fetch_product_details for product_vector_ids {product_vector_ids}: {e}")
+        db.rollback()
         return []
     return results
 
 
-def _calculate_similarity_to_search_term(
+def _calculate_similarity_to_search_terms(
     db: Session,
-    product_vector_id: int,
+    product_vector_ids: Set[int],
     normalized_search_name: str,
     search_vector: List[float]
-) -> float:
+) -> Dict[int, float]:
     """
-    Calcule le score de similarité combiné d'un produit par rapport à un terme de recherche.
+    Calcule en une seule requête le score de similarité combiné de plusieurs produits par rapport à un terme de recherche.
 
     Args:
         db: Session SQLAlchemy.
-        product_vector_id: ID du produit dans product_vector.
+        product_vector_ids: IDs des produits dans product_vector.
         normalized_search_name: Nom de recherche normalisé.
         search_vector: Vecteur du nom de recherche (list or np.array).
     Returns:
-        float: Score de similarité global.
+        Dict[int, float]: Score de similarité global par ID (les produits sans score calculable sont absents).
     """
-    score = 0.0
+    if not product_vector_ids:
+        return {}
+    scores: Dict[int, float] = {}
     try:
-        
+        # on calcule le score de similarité combiné entre le vecteur du nom de chaque produit et le nom de recherche via une combinaison pondérée vectorisation + similarité textuelle
         stmt = (
             select(
-                (0.4 * (1 - ProductVector.name_vector.cosine_distance(search_vector)) +
-                 0.6 * func.similarity(ProductVector.name, normalized_search_name)).label("global_score")
+                ProductVector.id,
+                (VECTOR_WEIGHT * (1 - ProductVector.name_vector.cosine_distance(search_vector)) +
+                 TRIGRAM_WEIGHT * func.similarity(ProductVector.name, normalized_search_name)).label("global_score")
             )
-            .where(ProductVector.id == product_vector_id)
+            .where(ProductVector.id.in_(product_vector_ids))
         )
-        # on calcule le score de similarité combiné entre le vecteur du nom du produit et le nom de recherche via une combinaison pondérée vectorisation + similarité textuelle
-        result = db.execute(stmt).scalar_one_or_none()
-        if result is not None:
-            score = float(result)
+        scores = {row.id: float(row.global_score) for row in db.execute(stmt) if row.global_score is not None}
     except Exception as e:
-        logger.error(f"Error calculating similarity score for pv_id {product_vector_id} against '{normalized_search_name}': {e}")
-    return score
+        logger.error(f"Error calculating similarity scores for pv_ids {product_vector_ids} against '{normalized_search_name}': {e}")
+        db.rollback()
+    return scores
 
 
 def _fetch_recipes_for_ingredient(
@@ -258,7 +399,8 @@ def _fetch_recipes_for_ingredient(
         collection = db["recipes"]
         query = {"normalized_ingredients": normalized_ingredient_name}
         
-        cursor = collection.find(query, {"_id": 0}).skip(skip).limit(limit)
+        # index multiclé recipes_normalized_ingredients (voir main_pipeline) ; batch_size=limit : un seul aller-retour
+        cursor = collection.find(query, {"_id": 0}).skip(skip).limit(limit).batch_size(limit)
         recipes_data = list(cursor)
     except Exception as e:
         logger.error(f"Error fetching recipes from MongoDB for ingredient '{normalized_ingredient_name}': {e}")
@@ -291,11 +433,12 @@ def _get_processed_products(
     # on récupère les détails des produits liés
     products_with_details = _fetch_product_details(db, all_unique_pv_ids_to_fetch)
 
-    # on calcule le score de similarité pour chaque produit
+    # on calcule le score de similarité de tous les produits en une seule requête
+    scores_to_search = _calculate_similarity_to_search_terms(
+        db, {product['id'] for product in products_with_details}, normalized_search_name, search_vector
+    )
     for product in products_with_details:
-        product['score_to_search'] = _calculate_similarity_to_search_term(
-            db, product['id'], normalized_search_name, search_vector
-        )
+        product['score_to_search'] = scores_to_search.get(product['id'], 0.0)
     
     best_product_per_source: Dict[str, Any] = {}
     # on trie les produits par source et par score de similarité
@@ -328,71 +471,139 @@ def _aggregate_product_details(
         Les clés conflictuelles sont préfixées par la source du produit.
     """
     global_details_aggregator: Dict[str, Any] = {}
-    excluded_keys_for_global_details = [
-        'id', 'name', 'source', 'score_to_search', 'name_vector',
-        'product_name', 'code',
-        'nom_produit_francais', 'code_agb', 'code_ciqual', 'lci_name'
-    ]
 
     for product in final_products_list:
+        source = product['source']
         for key, value in product.items():
-            if key not in excluded_keys_for_global_details and value is not None:
-                if key in global_details_aggregator and global_details_aggregator[key] != value:
-                    global_details_aggregator[f"{product['source']}_{key}"] = value
-                elif key not in global_details_aggregator:
-                    global_details_aggregator[key] = value
+            if value is None or key in EXCLUDED_KEYS_FOR_GLOBAL_DETAILS:
+                continue
+            # une seule recherche dans le dictionnaire : les valeurs agrégées ne sont jamais None
+            current_value = global_details_aggregator.get(key)
+            if current_value is None:
+                global_details_aggregator[key] = value
+            elif current_value != value:
+                global_details_aggregator[f"{source}_{key}"] = value
     return global_details_aggregator
 
-def _get_details_for_single_ingredient(
+def _get_details_for_ingredients(
     db: Session,
-    ingredient_name: str,
+    ingredient_names: Set[str],
     min_linked_similarity_score: float,
     min_initial_name_similarity: float
-) -> Dict[str, Any]:
+) -> Dict[str, Dict[str, Any]]:
     """
-    Récupère et agrège les détails pour un seul ingrédient, en utilisant les liens précalculés dans ingredient_link.
+    Récupère et agrège les détails de plusieurs ingrédients, en utilisant les liens précalculés dans ingredient_link.
+    Le nombre de requêtes ne dépend pas du nombre d'ingrédients.
 
     Args:
         db: Session SQLAlchemy.
-        ingredient_name: Nom de l'ingrédient (normalisé) à rechercher.
+        ingredient_names: Noms des ingrédients (normalisés) à rechercher.
         min_linked_similarity_score: Score de similarité minimal pour les produits liés.
         min_initial_name_similarity: Score de similarité minimal pour la recherche initiale du nom.
 
     Returns:
-        Dict[str, Any]: Dictionnaire des détails agrégés pour l'ingrédient.
-    """
-    logger.debug(f"Getting details for single ingredient: {ingredient_name}")
-
-    initial_pv_ids = _get_product_vector_ids_by_name(db, ingredient_name, min_initial_name_similarity)
-    if not initial_pv_ids:
-        logger.debug(f"No initial product_vector IDs found for {ingredient_name} with similarity {min_initial_name_similarity}")
-        return {"original_normalized_search_name": ingredient_name} 
-
-    all_pv_ids_to_consider = set(initial_pv_ids)
-    logger.debug(f"Initial PV IDs for {ingredient_name}: {initial_pv_ids}")
-    stmt_linked_from_source = (
-        select(IngredientLink.id_linked)
-        .where(
-            IngredientLink.id_source.in_(initial_pv_ids),
-            IngredientLink.score >= min_linked_similarity_score
+        Dict[str, Dict[str, Any]]: Dictionnaire des détails agrégés par nom d'ingrédient.
+    """
+    logger.debug(f"Getting details for {len(ingredient_names)} ingredients")
+
+    # on utilise en priorité les correspondances précalculées par le pipeline, sinon la recherche floue
+    initial_ids_by_name = _get_precomputed_product_vector_ids(db, ingredient_names, min_initial_name_similarity)
+    names_to_search = {name for name in ingredient_names if name not in initial_ids_by_name}
+    initial_ids_by_name.update(_get_product_vector_ids_by_names(db, names_to_search, min_initial_name_similarity))
+    all_initial_ids = set().union(*initial_ids_by_name.values())
+
+    # liens des produits initiaux dans les deux sens, pour tous les ingrédients en une requête : UNION ALL des deux sens
+    # (plutôt qu'un OR) pour que chacun soit servi par son index couvrant
+    linked_ids_by_id: Dict[int, Set[int]] = {}
+    if all_initial_ids:
+        links_from_initial = (
+            select(IngredientLink.id_source.label("initial_id"), IngredientLink.id_linked.label("linked_id"))
+            .where(IngredientLink.id_source.in_(all_initial_ids), IngredientLink.score >= min_linked_similarity_score)
         )
-    )
-    linked_ids_from_source = db.execute(stmt_linked_from_source).scalars().all()
-    all_pv_ids_to_consider.update(linked_ids_from_source)
-    stmt_linked_to_target = (
-        select(IngredientLink.id_source) 
-        .where(
-            IngredientLink.id_linked.in_(initial_pv_ids),
-            IngredientLink.score >= min_linked_similarity_score
+        links_to_initial = (
+            select(IngredientLink.id_linked.label("initial_id"), IngredientLink.id_source.label("linked_id"))
+            .where(IngredientLink.id_linked.in_(all_initial_ids), IngredientLink.score >= min_linked_similarity_score)
         )
-    )
-    linked_ids_to_target = db.execute(stmt_linked_to_target).scalars().all()
-    all_pv_ids_to_consider.update(linked_ids_to_target)
-    product_details_list = _fetch_product_details(db, all_pv_ids_to_consider)
-    logger.debug(f"Fetched details for {len(product_details_list)} products for {ingredient_name}")
-    ingredient_aggregated_details = _aggregate_product_details(product_details_list) if product_details_list else {}
-    ingredient_aggregated_details["original_normalized_search_name"] = ingredient_name
-    return ingredient_aggregated_details
+        for initial_id, linked_id in db.execute(union_all(links_from_initial, links_to_initial)).all():
+            linked_ids_by_id.setdefault(initial_id, set()).add(linked_id)
+
+    pv_ids_by_name: Dict[str, Set[int]] = {}
+    for name, initial_pv_ids in initial_ids_by_name.items():
+        pv_ids = set(initial_pv_ids)
+        for initial_pv_id in initial_pv_ids:
+            pv_ids.update(linked_ids_by_id.get(initial_pv_id, ()))
+        pv_ids_by_name[name] = pv_ids
+    product_details_list = _fetch_product_details(db, set().union(*pv_ids_by_name.values()))
+    logger.debug(f"Fetched details for {len(product_details_list)} products for {len(ingredient_names)} ingredients")
+
+    details_by_name: Dict[str, Dict[str, Any]] = {}
+    for name in ingredient_names:
+        pv_ids = pv_ids_by_name.get(name)
+        if not pv_ids:
+            logger.debug(f"No initial product_vector IDs found for {name} with similarity {min_initial_name_similarity}")
+            details_by_name[name] = {"original_normalized_search_name": name}
+            continue
+        # on garde l'ordre renvoyé par la base, comme pour un ingrédient seul
+        ingredient_products = [product for product in product_details_list if product['id'] in pv_ids]
+        ingredient_aggregated_details = _aggregate_product_details(ingredient_products) if ingredient_products else {}
+        ingredient_aggregated_details["original_normalized_search_name"] = name
+        details_by_name[name] = ingredient_aggregated_details
+    return details_by_name
+
+
+def _get_cached_details_for_ingredients(
+    db: Session,
+    ingredient_names: Set[str],
+    min_linked_similarity_score: float,
+    min_initial_name_similarity: float
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Renvoie les détails agrégés de plusieurs ingrédients, en ne recalculant que ceux absents du cache ou expirés.
+    Les entrées expirent après INGREDIENT_DETAILS_CACHE_TTL secondes ; les moins récemment utilisées sont évincées
+    au-delà de INGREDIENT_DETAILS_CACHE_MAXSIZE entrées. Le cache est propre au processus (un par worker uvicorn).
+
+    Args:
+        db: Session SQLAlchemy.
+        ingredient_names: Noms des ingrédients (normalisés) à rechercher.
+        min_linked_similarity_score: Score de similarité minimal pour les produits liés.
+        min_initial_name_similarity: Score de similarité minimal pour la recherche initiale du nom.
+    Returns:
+        Dict[str, Dict[str, Any]]: Dictionnaire des détails agrégés par nom d'ingrédient (à ne pas modifier : partagé par le cache).
+    """
+    now = monotonic()
+    details_by_name: Dict[str, Dict[str, Any]] = {}
+    names_to_fetch = set()
+    with _ingredient_details_cache_lock:
+        for name in ingredient_names:
+            key = (name, min_linked_similarity_score, min_initial_name_similarity)
+            cached = _ingredient_details_cache.get(key)
+            if cached is not None and cached[0] > now:
+                _ingredient_details_cache.move_to_end(key)
+                details_by_name[name] = cached[1]
+            else:
+                names_to_fetch.add(name)
+    if not names_to_fetch:
+        return details_by_name
+    logger.debug(f"Ingredient details cache: {len(details_by_name)} hits, {len(names_to_fetch)} misses")
+
+    fetched_details = _get_details_for_ingredients(db, names_to_fetch, min_linked_similarity_score, min_initial_name_similarity)
+    expires_at = monotonic() + INGREDIENT_DETAILS_CACHE_TTL
+    with _ingredient_details_cache_lock:
+        for name, details in fetched_details.items():
+            key = (name, min_linked_similarity_score, min_initial_name_similarity)
+            _ingredient_details_cache[key] = (expires_at, details)
+            _ingredient_details_cache.move_to_end(key)
+        while len(_ingredient_details_cache) > INGREDIENT_DETAILS_CACHE_MAXSIZE:
+            _ingredient_details_cache.popitem(last=False)
+    details_by_name.update(fetched_details)
+    return details_by_name
+
+def clear_ingredient_details_cache():
+    """
+    Vide le cache des détails d'ingrédients du processus courant, à appeler quand les produits ou leurs liens ont changé.
+    """
+    with _ingredient_details_cache_lock:
+        _ingredient_details_cache.clear()
 
 
 def _aggregate_details_for_recipe(
@@ -410,22 +621,7 @@ def _aggregate_details_for_recipe(
         Les valeurs sont pondérées par les quantités d'ingrédients.
     """
 
-    recipe_details: Dict[str, Any] = {}
-    summable_fields = [
-        "energy_kcal_100g", "fat_100g", "saturated_fat_100g", "carbohydrates_100g",
-        "sugars_100g", "fiber_100g", "proteins_100g", "salt_100g", "sodium_100g",
-        "changement_climatique", "score_unique_ef", "ecotoxicite_eau_douce",
-        "epuisement_ressources_energetiques", "eutrophisation_marine",
-        "effets_tox_cancerogenes", "epuisement_ressources_eau", "eutrophisation_terrestre",
-        "utilisation_sol", "effets_tox_non_cancerogenes", "epuisement_ressources_mineraux",
-        "particules_fines", "formation_photochimique_ozone", "changement_climatique_biogenique",
-        "acidification_terrestre_eaux_douces", "changement_climatique_cas",
-        "appauvrissement_couche_ozone", "rayonnements_ionisants", "eutrophisation_eaux_douces",
-        "changement_climatique_fossile"
-    ]
-
-    for field in summable_fields:
-        recipe_details[field] = 0.0
+    recipe_details: Dict[str, Any] = dict.fromkeys(RECIPE_SUMMABLE_FIELDS, 0.0)
 
     all_months_lists: List[List[str]] = []
     processed_ingredients_with_details_count = 0
@@ -445,7 +641,7 @@ def _aggregate_details_for_recipe(
         if quantity_grams is None:
             quantity_grams = DEFAULT_QUANTITY_GRAMS
 
-        for field in summable_fields:
+        for field in RECIPE_SUMMABLE_FIELDS:
             value_per_100g = ing_details_from_cache.get(field)
             if isinstance(value_per_100g, (int, float)):
                 recipe_details[field] += (value_per_100g / 100.0) * quantity_grams
@@ -454,19 +650,14 @@ def _aggregate_details_for_recipe(
             all_months_lists.append(ing_details_from_cache["months_in_season"])
 
     if all_months_lists:
-        common_months = set(all_months_lists[0])
-        for month_list in all_months_lists[1:]:
-            common_months.intersection_update(month_list)
-        if common_months: # type: ignore
-            recipe_details["months_in_season"] = sorted(list(common_months))
-            union_months = set()
-            for month_list in all_months_lists:
-                union_months.update(month_list)
-            recipe_details["months_in_season"] = sorted(list(union_months))
+        # les mois de saison ne sont renseignés que si les ingrédients de saison ont au moins un mois en commun,
+        # et valent alors l'union de leurs mois
+        if set(all_months_lists[0]).intersection(*all_months_lists[1:]):
+            recipe_details["months_in_season"] = sorted(set().union(*all_months_lists))
     elif processed_ingredients_with_details_count > 0:
         recipe_details["months_in_season"] = []
 
-    for field in summable_fields:
+    for field in RECIPE_SUMMABLE_FIELDS:
         if isinstance(recipe_details[field], float):
             recipe_details[field] = round(recipe_details[field], 3)
 
@@ -494,26 +685,21 @@ def get_enriched_recipes_details(
         List[Dict[str, Any]]: Liste des recettes enrichies.
     """
     logger.debug("Starting enrichment for multiple recipes.")
-    all_unique_normalized_ingredients_to_fetch = set()
-    for recipe in recipes:
-        parsed_ingredients_list = recipe.get("parsed_ingredients_details", [])
-        if parsed_ingredients_list:
-            for ing_detail in parsed_ingredients_list:
-                normalized_name_key = ing_detail.get("normalized_name_for_matching")
-                if normalized_name_key:
-                    all_unique_normalized_ingredients_to_fetch.add(normalized_name_key)
-                    
+    all_unique_normalized_ingredients_to_fetch = {
+        ing_detail["normalized_name_for_matching"]
+        for recipe in recipes
+        for ing_detail in recipe.get("parsed_ingredients_details") or []
+        if ing_detail.get("normalized_name_for_matching")
+    }
     logger.debug(f"Found {len(all_unique_normalized_ingredients_to_fetch)} unique normalized ingredients to fetch details for.")
     ingredient_details_cache: Dict[str, Dict[str, Any]] = {}
     if db and all_unique_normalized_ingredients_to_fetch:
-        for ing_key_name in all_unique_normalized_ingredients_to_fetch:
-            details = _get_details_for_single_ingredient(
-                db,
-                ing_key_name,
-                min_linked_similarity_score,
-                min_initial_name_similarity
-            )
-            ingredient_details_cache[ing_key_name] = details
+        ingredient_details_cache = _get_cached_details_for_ingredients(
+            db,
+            all_unique_normalized_ingredients_to_fetch,
+            min_linked_similarity_score,
+            min_initial_name_similarity
+        )
 
     logger.debug("Aggregating details for each recipe using cached ingredient info.")
     enriched_recipes_list = []
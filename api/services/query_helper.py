@@ -89,7 +89,8 @@ def get_recipe_sort_criteria(sort_by: SortCriteria, text_search: Optional[str])
         Optional[List[tuple]]: Liste des critères de tri MongoDB, ou None.
     """
     if sort_by == SortCriteria.TOTAL_TIME:
-        return [("totalTime", 1)]
+        # même ordre de clés que l'index recipes_category_total_time, _id rend la pagination déterministe
+        return [("totalTime", 1), ("_id", 1)]
     elif sort_by == SortCriteria.SCORE and text_search:
         return [("score", {"$meta": "textScore"})]
     return None
\ No newline at end of file
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, UniqueConstraint, Text
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, UniqueConstraint, Text, Index
+from sqlalchemy.orm import relationship, declarative_base, deferred
 from pgvector.sqlalchemy import Vector
 
 Base = declarative_base()
@@ -15,10 +15,14 @@ class ProductVector(Base):
     __tablename__ = "product_vector"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(Text, nullable=False)
-    name_vector = Column(Vector(384))
+    # embedding de 384 floats (~1,5 Ko par ligne) : chargé uniquement à la demande, les calculs de similarité se font côté PostgreSQL
+    name_vector = deferred(Column(Vector(384)))
     source = Column(String(32), nullable=False)
 
-    __table_args__ = (UniqueConstraint('name', 'source', name='uq_product_vector_name_source'),)
+    __table_args__ = (
+        UniqueConstraint('name', 'source', name='uq_product_vector_name_source'),
+        Index('idx_product_vector_name', 'name'),
+    )
 
     agribalyse_entries = relationship("Agribalyse", back_populates="product_vector_item", cascade="all, delete-orphan")
     openfoodfacts_entries = relationship("OpenFoodFacts", back_populates="product_vector_item", cascade="all, delete-orphan")
@@ -123,3 +127,18 @@ class IngredientLink(Base):
 
     source_product = relationship("ProductVector", foreign_keys=[id_source], back_populates="source_links")
     linked_product = relationship("ProductVector", foreign_keys=[id_linked], back_populates="linked_links")
+
+class IngredientNameLink(Base):
+    __tablename__ = "ingredient_name_link"
+    normalized_name = Column(Text, primary_key=True)
+    product_vector_id = Column(Integer, ForeignKey("product_vector.id", ondelete="CASCADE"), primary_key=True)
+    similarity = Column(Float)
+
+class ProductJob(Base):
+    __tablename__ = "product_jobs"
+    job_id = Column(String(32), primary_key=True)
+    product_vector_id = Column(Integer, ForeignKey("product_vector.id", ondelete="CASCADE"), index=True)
+    status = Column(String(16), nullable=False, default="pending") # pending, done ou failed
+    message = Column(Text)
+
+    product_vector_item = relationship("ProductVector")
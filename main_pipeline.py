@@ -6,14 +6,14 @@ import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from processing.utils import get_db_connection
-from processing.build_ingredient_links import create_ingredient_link_table, fill_ingredient_links
+from processing.build_ingredient_links import create_ingredient_link_table, fill_ingredient_links, create_ingredient_name_link_table, fill_ingredient_name_links, migrate_ingredient_link_covering_indexes
 from processing.init_pgvector_tables import init_db
 from processing.agribalyse_api import extract_agribalyse_data, load_agribalyse_data_to_db
 from processing.openfoodfacts_script import load_openfoodfacts_chunk_to_db, pipeline_openfoodfacts
 from processing.scraping_greenpeace import scrape_greenpeace_calendar, insert_season_data_to_db
 from processing.scraping_marmiton import extract_all_recipes
 from processing.clean_recipes_times import convert_recipe_times
-from processing.clean_marmiton_ingredients import extract_ingredients_mongo, insert_ingredients_to_pgvector, update_recipes_with_normalized_ingredients  
+from processing.clean_marmiton_ingredients import extract_ingredients_mongo, insert_ingredients_to_pgvector, update_recipes_with_normalized_ingredients, extract_normalized_ingredient_names
 import pandas as pd
 import pymongo
 
@@ -131,8 +131,19 @@ def main():
     recipes_need_parsing = not are_recipes_parsed()
     need_users = not is_source_filled('users')
     need_ingredients_link = not is_source_filled('ingredient_link')
+    need_ingredient_name_link = need_ingredients_link or not is_source_filled('ingredient_name_link')
     need_marmiton_processing = not marmiton_already_scraped or recipes_need_parsing
-    if not (need_init_db or need_agribalyse or need_openfoodfacts or need_greenpeace or need_marmiton_processing or need_users or need_ingredients_link):
+    if not need_ingredients_link:
+        # migration des index de ingredient_link existante vers les index couvrants, sans bloquer les écritures (CONCURRENTLY) ;
+        # elle est faite ici plutôt qu'au démarrage de l'API, et ne fait rien une fois les index en place
+        try:
+            conn = get_db_connection()
+            if conn is not None:
+                migrate_ingredient_link_covering_indexes(conn)
+                conn.close()
+        except Exception as e:
+            logging.error(f"Erreur lors de la migration des index de la table ingredient_link : {e}")
+    if not (need_init_db or need_agribalyse or need_openfoodfacts or need_greenpeace or need_marmiton_processing or need_users or need_ingredients_link or need_ingredient_name_link):
         logging.info('Toutes les sources (Postgres + MongoDB Marmiton) sont déjà remplies. Arrêt du pipeline.')
         return
     try:
@@ -237,12 +248,29 @@ def main():
                     return
                 create_ingredient_link_table(conn)
                 fill_ingredient_links(conn)
+                migrate_ingredient_link_covering_indexes(conn)
                 conn.close()
                 logging.info(f"Table ingredient_link créée et remplie avec succès en {time.time()-start_link:.2f} sec.")
             except Exception as e:
                 logging.error(f'Erreur lors de la création/remplissage de la table ingredient_link : {e}')
+
+        if need_ingredient_name_link: # recalculée avec ingredient_link, ou si elle manque sur une base déjà remplie
+            start_name_link = time.time()
+            logging.info('Création et remplissage de la table ingredient_name_link...')
+            try:
+                conn = get_db_connection()
+                if conn is None:
+                    print("Connexion à la base impossible.")
+                    return
+                # on précalcule la correspondance nom d'ingrédient des recettes -> product_vector, utilisée par l'API
+                create_ingredient_name_link_table(conn)
+                fill_ingredient_name_links(conn, extract_normalized_ingredient_names())
+                conn.close()
+                logging.info(f"Table ingredient_name_link créée et remplie avec succès en {time.time()-start_name_link:.2f} sec.")
+            except Exception as e:
+                logging.error(f'Erreur lors de la création/remplissage de la table ingredient_name_link : {e}')
                 
-        logging.info("Vérification et création de l'index texte pour MongoDB recipes...")
+        logging.info("Vérification et création des index pour MongoDB recipes...")
         mongo_client = None
         # on créer des index sur les champs texte de recipes pour améliorer les performances de recherche
         try:
@@ -272,6 +300,19 @@ def main():
                 logging.info(f"Création de l'index texte '{text_index_name}' sur les champs: title, keywords, description.")
                 collection.create_index(fields_for_text_index, name=text_index_name)
                 logging.info(f"Index texte '{text_index_name}' créé avec succès.")
+
+            # index composé correspondant aux filtres (category, totalTime) et au tri par temps de /recipes
+            filter_index_name = "recipes_category_total_time"
+            collection.create_index(
+                [("category", pymongo.ASCENDING), ("totalTime", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)],
+                name=filter_index_name
+            )
+            logging.info(f"Index '{filter_index_name}' vérifié/créé sur les champs: category, totalTime, _id.")
+
+            # index multiclé sur les ingrédients normalisés : recettes d'un ingrédient (/ingredient) et filtres par ingrédients de /recipes
+            ingredients_index_name = "recipes_normalized_ingredients"
+            collection.create_index([("normalized_ingredients", pymongo.ASCENDING)], name=ingredients_index_name)
+            logging.info(f"Index '{ingredients_index_name}' vérifié/créé sur le champ: normalized_ingredients.")
         except Exception as e_index:
             logging.error(f"Une erreur est survenue lors de la gestion de l'index texte MongoDB: {e_index}")
         finally:
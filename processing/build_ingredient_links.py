@@ -1,9 +1,30 @@
+from psycopg2.extras import execute_values
 from processing.ingredient_similarity import find_similar_ingredients
 from processing.utils import get_db_connection
 
+# similarité pg_trgm minimale conservée dans ingredient_name_link (seuil par défaut le plus bas de l'API)
+INGREDIENT_NAME_LINK_MIN_SIMILARITY = 0.25
+# nombre de liens accumulés en mémoire avant chaque insertion dans ingredient_link
+INGREDIENT_LINK_BATCH_SIZE = 5000
+# nombre de noms d'ingrédients rapprochés de product_vector par requête pour remplir ingredient_name_link
+INGREDIENT_NAME_LINK_BATCH_SIZE = 1000
+
+# index composites couvrants (INCLUDE) de ingredient_link : la recherche des meilleurs liens dans chaque sens se fait
+# en index-only scan. Chaque entrée donne le nom de l'index, sa définition et l'ancien index non couvrant qu'il remplace.
+INGREDIENT_LINK_COVERING_INDEXES = (
+    ("idx_ingredient_link_id_source_linked_source_score_cov",
+     "ingredient_link (id_source, linked_source, score DESC) INCLUDE (id_linked)",
+     "idx_ingredient_link_id_source_linked_source_score"),
+    ("idx_ingredient_link_id_linked_source_text_score_cov",
+     "ingredient_link (id_linked, source, score DESC) INCLUDE (id_source)",
+     "idx_ingredient_link_id_linked_source_text_score"),
+)
+
 def create_ingredient_link_table(conn):
     """
     Crée la table 'ingredient_link' et ses index si elle n'existe pas.
+    Les index composites couvrants ne sont créés ici qu'avec la table (elle est alors vide) : sur une table existante,
+    ils sont ajoutés par migrate_ingredient_link_covering_indexes, sans bloquer les écritures ni le démarrage de l'API.
 
     Args:
         conn (psycopg2.extensions.connection): Connexion à la base de données PostgreSQL.
@@ -11,6 +32,8 @@ def create_ingredient_link_table(conn):
         None: La fonction modifie la base de données directement.
     """
     cur = conn.cursor()
+    cur.execute("SELECT to_regclass('ingredient_link') IS NULL;")
+    table_is_new = cur.fetchone()[0]
     cur.execute("""
         CREATE TABLE IF NOT EXISTS ingredient_link (
             id_source INTEGER REFERENCES product_vector(id),
@@ -27,36 +50,221 @@ def create_ingredient_link_table(conn):
     cur.execute("CREATE INDEX IF NOT EXISTS idx_ingredient_link_source_text ON ingredient_link (source);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_ingredient_link_linked_source ON ingredient_link (linked_source);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_ingredient_link_score ON ingredient_link (score DESC);")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_ingredient_link_id_source_linked_source_score ON ingredient_link (id_source, linked_source, score DESC);")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_ingredient_link_id_linked_source_text_score ON ingredient_link (id_linked, source, score DESC);")
+    if table_is_new:
+        for index_name, index_definition, _ in INGREDIENT_LINK_COVERING_INDEXES:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {index_definition};")
     conn.commit()
     cur.close()
 
-def fill_ingredient_links(conn):
+def migrate_ingredient_link_covering_indexes(conn):
+    """
+    Ajoute les index couvrants à une table 'ingredient_link' existante, puis supprime les anciens index composites
+    qu'ils remplacent. Les index sont construits avec CONCURRENTLY (hors transaction) pour ne pas bloquer les écritures ;
+    une construction interrompue laisse un index invalide, qui est supprimé pour être reconstruit au passage suivant.
+    À lancer depuis le pipeline, jamais au démarrage de l'API.
+
+    Args:
+        conn (psycopg2.extensions.connection): Connexion à la base de données PostgreSQL.
+    Returns:
+        None: La fonction modifie la base de données directement.
+    """
+    conn.commit()
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        for index_name, index_definition, replaced_index_name in INGREDIENT_LINK_COVERING_INDEXES:
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {index_definition};")
+            cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s);", (index_name,))
+            row = cur.fetchone()
+            if row and row[0]:
+                # l'ancien index n'est supprimé qu'une fois son remplaçant construit et valide
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {replaced_index_name};")
+            else:
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name};")
+    finally:
+        cur.close()
+        conn.autocommit = previous_autocommit
+
+def _insert_ingredient_links(cur, link_rows):
+    """
+    Insère un lot de liens dans la table 'ingredient_link' (une requête multi-lignes par page).
+
+    Args:
+        cur (psycopg2.extensions.cursor): Curseur de la connexion qui remplit la table.
+        link_rows (List[Tuple]): Liens (id_source, source, id_linked, linked_source, score) à insérer.
+    """
+    execute_values(cur, """
+        INSERT INTO ingredient_link (id_source, source, id_linked, linked_source, score)
+        VALUES %s
+        ON CONFLICT (id_source, source, id_linked, linked_source) DO UPDATE SET score = EXCLUDED.score;
+    """, link_rows, page_size=500)
+
+def fill_ingredient_links(conn, batch_size=INGREDIENT_LINK_BATCH_SIZE):
     """
     Remplit la table 'ingredient_link' avec les liens entre ingrédients similaires.
 
     Args:
         conn (psycopg2.extensions.connection): Connexion à la base de données PostgreSQL.
+        batch_size (int, optional): Nombre de liens accumulés avant chaque insertion. Défaut à INGREDIENT_LINK_BATCH_SIZE.
     Returns:
         None: La fonction modifie la base de données directement.
     """
     cur = conn.cursor()
-    cur.execute("SELECT id, name, source FROM product_vector;")
-    all_products = cur.fetchall()
-    for prod_id, name, source in all_products:
+    # curseur serveur : les produits sont lus par lots au lieu d'être tous chargés en mémoire
+    scan = conn.cursor(name='product_vector_scan')
+    scan.itersize = 10000
+    scan.execute("SELECT id, name, source FROM product_vector;")
+    link_rows = []
+    for prod_id, name, source in scan:
         # on boucle sur tous les produits dans product_vector pour chercher les ingrédients similaires à ce produit des autres sources
         similars = find_similar_ingredients(name, source, conn)
-        # pour chaque ingrédient similaire trouvé, on insère un lien dans la table ingredient_link
+        # pour chaque ingrédient similaire trouvé, on prépare un lien à insérer dans la table ingredient_link
         for other_source, match in similars.items():
-            cur.execute("""
-                INSERT INTO ingredient_link (id_source, source, id_linked, linked_source, score)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (id_source, source, id_linked, linked_source) DO UPDATE SET score = EXCLUDED.score;
-            """, (prod_id, source, match['id'], other_source, match['score']))
+            link_rows.append((prod_id, source, match['id'], other_source, match['score']))
+        # les liens sont insérés par lots : la mémoire utilisée ne dépend pas de la taille de product_vector
+        # (pas de commit intermédiaire, qui fermerait le curseur serveur)
+        if len(link_rows) >= batch_size:
+            _insert_ingredient_links(cur, link_rows)
+            link_rows = []
+    scan.close()
+    if link_rows:
+        _insert_ingredient_links(cur, link_rows)
     conn.commit()
     cur.close()
 
+def create_ingredient_name_link_table(conn):
+    """
+    Crée la table 'ingredient_name_link' (nom d'ingrédient normalisé -> product_vector) si elle n'existe pas.
+
+    Args:
+        conn (psycopg2.extensions.connection): Connexion à la base de données PostgreSQL.
+    Returns:
+        None: La fonction modifie la base de données directement.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingredient_name_link (
+            normalized_name TEXT,
+            product_vector_id INTEGER REFERENCES product_vector(id) ON DELETE CASCADE,
+            similarity REAL,
+            PRIMARY KEY (normalized_name, product_vector_id)
+        );
+    """)
+    conn.commit()
+    cur.close()
+
+def _compute_ingredient_name_links(cur, normalized_names, min_similarity):
+    """
+    Calcule en une seule requête les correspondances nom d'ingrédient normalisé -> product_vector, avec la logique de
+    recherche de l'API : correspondance exacte si elle existe, sinon similarité pg_trgm (opérateur %, servi par
+    l'index GIN sur le nom). La recherche floue n'est faite que pour les noms sans correspondance exacte.
+
+    Args:
+        cur (psycopg2.extensions.cursor): Curseur PostgreSQL.
+        normalized_names (Iterable[str]): Noms d'ingrédients normalisés à relier.
+        min_similarity (float): Similarité minimale conservée.
+    Returns:
+        List[Tuple[str, int, float]]: Lignes (normalized_name, product_vector_id, similarity) à insérer.
+    """
+    names = sorted({name for name in normalized_names if name})
+    if not names:
+        return []
+    # seuil de l'opérateur % pour la transaction en cours
+    cur.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true);", (str(min_similarity),))
+    cur.execute("""
+        WITH names_to_link AS (
+            SELECT name FROM unnest(%s::text[]) AS input(name)
+        ), exact_matches AS (
+            SELECT names_to_link.name, pv.id
+            FROM names_to_link
+            JOIN product_vector pv ON pv.name = names_to_link.name
+        )
+        SELECT name, id, 1.0 FROM exact_matches
+        UNION ALL
+        SELECT names_to_link.name, pv.id, similarity(pv.name, names_to_link.name)
+        FROM names_to_link
+        JOIN product_vector pv ON pv.name %% names_to_link.name
+        WHERE NOT EXISTS (SELECT 1 FROM exact_matches WHERE exact_matches.name = names_to_link.name);
+    """, (names,))
+    return cur.fetchall()
+
+def _insert_ingredient_name_links(cur, rows):
+    """
+    Insère des correspondances dans la table 'ingredient_name_link' (une requête multi-lignes par page).
+
+    Args:
+        cur (psycopg2.extensions.cursor): Curseur PostgreSQL.
+        rows (List[Tuple[str, int, float]]): Lignes (normalized_name, product_vector_id, similarity) à insérer.
+    """
+    execute_values(cur, """
+        INSERT INTO ingredient_name_link (normalized_name, product_vector_id, similarity)
+        VALUES %s
+        ON CONFLICT (normalized_name, product_vector_id) DO UPDATE SET similarity = EXCLUDED.similarity;
+    """, rows, page_size=500)
+
+def _link_ingredient_names(cur, normalized_names, min_similarity, batch_size=INGREDIENT_NAME_LINK_BATCH_SIZE):
+    """
+    Calcule et insère les correspondances des noms d'ingrédients par lots : une requête de calcul et une insertion
+    groupée par lot de noms, pour que la mémoire utilisée ne dépende pas du nombre de noms.
+
+    Args:
+        cur (psycopg2.extensions.cursor): Curseur PostgreSQL.
+        normalized_names (Iterable[str]): Noms d'ingrédients normalisés à relier.
+        min_similarity (float): Similarité minimale conservée.
+        batch_size (int, optional): Nombre de noms par requête. Défaut à INGREDIENT_NAME_LINK_BATCH_SIZE.
+    """
+    names = sorted({name for name in normalized_names if name})
+    for start in range(0, len(names), batch_size):
+        rows = _compute_ingredient_name_links(cur, names[start:start + batch_size], min_similarity)
+        if rows:
+            _insert_ingredient_name_links(cur, rows)
+
+def fill_ingredient_name_links(conn, normalized_names, min_similarity=INGREDIENT_NAME_LINK_MIN_SIMILARITY):
+    """
+    Précalcule, pour chaque nom d'ingrédient normalisé des recettes, les product_vector correspondants.
+    On reprend la logique de recherche de l'API : correspondance exacte si elle existe, sinon similarité pg_trgm.
+
+    Args:
+        conn (psycopg2.extensions.connection): Connexion à la base de données PostgreSQL.
+        normalized_names (Iterable[str]): Noms d'ingrédients normalisés à relier.
+        min_similarity (float, optional): Similarité minimale conservée. Défaut à INGREDIENT_NAME_LINK_MIN_SIMILARITY.
+    Returns:
+        None: La fonction modifie la base de données directement.
+    """
+    cur = conn.cursor()
+    # les liens sont recalculés entièrement à chaque passage du pipeline
+    cur.execute("TRUNCATE ingredient_name_link;")
+    _link_ingredient_names(cur, normalized_names, min_similarity)
+    conn.commit()
+    cur.close()
+
+def refresh_ingredient_name_links(cur, product_names, min_similarity=INGREDIENT_NAME_LINK_MIN_SIMILARITY):
+    """
+    Met à jour 'ingredient_name_link' après l'ajout de produits dans product_vector : les noms déjà précalculés proches
+    des noms des nouveaux produits (opérateur pg_trgm %) sont recalculés, ainsi que les noms des nouveaux produits.
+    Sans commit : l'appelant valide la transaction.
+
+    Args:
+        cur (psycopg2.extensions.cursor): Curseur PostgreSQL.
+        product_names (Iterable[str]): Noms normalisés des produits ajoutés.
+        min_similarity (float, optional): Similarité minimale conservée. Défaut à INGREDIENT_NAME_LINK_MIN_SIMILARITY.
+    Returns:
+        None: La fonction modifie la base de données directement.
+    """
+    product_names = sorted({name for name in product_names if name})
+    if not product_names:
+        return
+    cur.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true);", (str(min_similarity),))
+    cur.execute("""
+        SELECT DISTINCT inl.normalized_name
+        FROM ingredient_name_link inl
+        JOIN unnest(%s::text[]) AS new_product(name) ON inl.normalized_name %% new_product.name;
+    """, (product_names,))
+    names_to_refresh = sorted(set(product_names) | {row[0] for row in cur.fetchall()})
+    cur.execute("DELETE FROM ingredient_name_link WHERE normalized_name = ANY(%s);", (names_to_refresh,))
+    _link_ingredient_names(cur, names_to_refresh, min_similarity)
+
 if __name__ == '__main__':
     conn = get_db_connection()
     if conn is None:
@@ -64,4 +272,5 @@ if __name__ == '__main__':
     else:
         create_ingredient_link_table(conn)
         fill_ingredient_links(conn)
+        migrate_ingredient_link_covering_indexes(conn)
         conn.close()
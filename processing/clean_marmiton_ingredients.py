@@ -124,6 +124,22 @@ def update_recipes_with_normalized_ingredients():
             collection.update_one({"_id": doc["_id"]}, {"$set": {"parsed_ingredients_details": parsed_details_for_this_recipe, "normalized_ingredients": normalized_ingredient_names_for_search}})
     client.close()
 
+def extract_normalized_ingredient_names():
+    """
+    Récupère l'ensemble des noms d'ingrédients normalisés utilisés dans les recettes MongoDB.
+
+    Args:
+        None
+    Returns:
+        set: Noms d'ingrédients normalisés distincts.
+    """
+    client = MongoClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017/"), serverSelectionTimeoutMS=5000)
+    db = client["OpenFoodImpact"]
+    collection = db["recipes"]
+    names = {name for name in collection.distinct("normalized_ingredients") if isinstance(name, str) and name}
+    client.close()
+    return names
+
 if __name__ == "__main__":
     print("Extraction des ingrédients Marmiton pour product_vector (nouveaux ou mis à jour)...")
     df_ingredients_for_pv = extract_ingredients_mongo()
@@ -2,6 +2,28 @@
 import logging
 logger = logging.getLogger(__name__)
 
+# paires de sources comparées par nom exact plutôt que par similarité
+EXACT_MATCH_SOURCES = {
+    'greenpeace': ['marmiton', 'agribalyse'],
+    'marmiton': ['greenpeace'],
+    'agribalyse': ['greenpeace'],
+}
+# pondération du score global : similarité vectorielle (pgvector) et similarité textuelle (pg_trgm)
+VECTOR_WEIGHT = 0.4
+TRIGRAM_WEIGHT = 0.6
+
+def min_trigram_similarity(min_score):
+    """
+    Calcule la similarité textuelle minimale qu'un candidat doit avoir pour pouvoir atteindre le score global minimal,
+    la similarité vectorielle valant au plus 1.
+
+    Args:
+        min_score (float): Score de similarité global minimal.
+    Returns:
+        float: Seuil pg_trgm en dessous duquel aucun candidat ne peut atteindre min_score (0 si aucun filtre possible).
+    """
+    return max((min_score - VECTOR_WEIGHT) / TRIGRAM_WEIGHT, 0.0)
+
 def find_similar_ingredients(name, source, conn, min_score=0.65):
     """
     Trouve les produits similaires à un ingrédient donné dans d'autres sources.
@@ -15,42 +37,37 @@ def find_similar_ingredients(name, source, conn, min_score=0.65):
         dict: Clés = autres sources, Valeurs = {'id', 'name', 'score'} du meilleur match.
         Utilise un matching exact pour greenpeace vs (marmiton/agribalyse), sinon fuzzy+vector.
     """
+    exact_sources = EXACT_MATCH_SOURCES.get(source, [])
+    trgm_threshold = min_trigram_similarity(min_score)
     cur = conn.cursor()
-    cur.execute("SELECT DISTINCT source FROM product_vector;")
-    all_sources = [row[0] for row in cur.fetchall()]
+    # une seule requête pour toutes les autres sources : DISTINCT ON garde le meilleur candidat de chaque source.
+    # l'opérateur % (index GIN pg_trgm) écarte les candidats qui ne peuvent pas atteindre min_score, au lieu de
+    # calculer le score sur toute la table ; l'index HNSW ne peut pas servir ici car le tri porte sur le score combiné
+    cur.execute("""
+        SET LOCAL pg_trgm.similarity_threshold = %(trgm_threshold)s;
+        WITH reference AS (
+            SELECT name, name_vector FROM product_vector WHERE name = %(name)s AND source = %(source)s
+        ),
+        candidates AS (
+            SELECT pv.id, pv.name, pv.source, 1.0::float8 AS global_score
+            FROM product_vector pv
+            WHERE pv.name = %(name)s AND pv.source = ANY(%(exact_sources)s)
+            UNION ALL
+            SELECT pv.id, pv.name, pv.source, (%(vector_weight)s * (1 - (pv.name_vector <=> r.name_vector)) + %(trigram_weight)s * similarity(pv.name, r.name)) AS global_score
+            FROM product_vector pv
+            CROSS JOIN reference r
+            WHERE pv.source <> %(source)s AND NOT (pv.source = ANY(%(exact_sources)s))
+              AND (%(trgm_threshold)s <= 0 OR pv.name %% %(name)s)
+        )
+        SELECT DISTINCT ON (source) id, name, source, global_score
+        FROM candidates
+        ORDER BY source, global_score DESC NULLS LAST;
+    """, {'name': name, 'source': source, 'exact_sources': exact_sources, 'trgm_threshold': trgm_threshold,
+          'vector_weight': VECTOR_WEIGHT, 'trigram_weight': TRIGRAM_WEIGHT})
     results = {}
-    # récupère toutes les sources pour iterer dessus
-    for other_source in all_sources:
-        if other_source == source:
-            continue
-        # pour chaque source, sauf celle actuelle, on cherche les ingrédients similaires
-        if (source == 'greenpeace' and other_source in ['marmiton', 'agribalyse']) or \
-           (other_source == 'greenpeace' and source in ['marmiton', 'agribalyse']):
-            # Matching exact
-            cur.execute("""
-                SELECT id, name FROM product_vector
-                WHERE name = %s AND source = %s
-                LIMIT 1;
-            """, (name, other_source))
-            match = cur.fetchone()
-            if match:
-                results[other_source] = {'id': match[0], 'name': match[1], 'score': 1.0}
-        else:
-            # Fuzzy + vector
-            cur.execute("""
-                WITH reference AS (
-                    SELECT name, name_vector FROM product_vector WHERE name = %s AND source = %s
-                )
-                SELECT pv.id, pv.name, (0.4 * (1 - (pv.name_vector <=> r.name_vector)) + 0.6 * similarity(pv.name, r.name)) AS global_score
-                FROM product_vector pv
-                CROSS JOIN reference r
-                WHERE pv.source = %s
-                ORDER BY global_score DESC
-                LIMIT 1;
-            """, (name, source, other_source))
-            match = cur.fetchone()
-            if match and match[2] >= min_score:
-                results[other_source] = {'id': match[0], 'name': match[1], 'score': match[2]}
-        logger.debug(f"Found {len(results)} similar ingredients for {name} in source {source} against {other_source}")
+    for match_id, match_name, other_source, score in cur.fetchall():
+        if score is not None and score >= min_score:
+            results[other_source] = {'id': match_id, 'name': match_name, 'score': score}
+    logger.debug("Found %d similar ingredients for %s in source %s", len(results), name, source)
     cur.close()
     return results
@@ -1,4 +1,5 @@
 import os
+import functools
 from typing import Dict, Any
 import psycopg2
 import unicodedata
@@ -85,6 +86,25 @@ UNIT_TO_GRAMS_APPROX = {
 
 DEFAULT_QUANTITY_GRAMS = 100
 
+# adjectifs et quantités éliminés de la normalisation des noms de produits
+ADJECTIFS = {"frais", "fraiche", "fraîche", "bio", "entier", "entiere", 
+             "petit", "petite", "grand", "grande", "moyen", "moyenne", "sec", "sèche", "moelleux", "moelleuse", "demi", "demie", "nouveau", 
+             "nouvelle", "vieux", "vieille", "jeune", "rond", "ronde", "long", "longue", "court", "courte", "gros", "grosse", "fin", "fine", 
+             "épais", "épaisse", "blanc", "blanche", "rouge", "jaune", "vert", "verte", "noir", "noire", "rose", "violet", "violette", "orange", 
+             "doré", "dorée", "brun", "brune", "cru", "crue", "cuit", "cuite", "surgelé", "surgelée", "nature", "complet", "complète", "allégé", 
+             "allégée", "léger", "légère", "extra", "double", "triple", "simple", "sec", "secs", "sèche", "sèches"}
+QUANTITES = {"quelques", "beaucoup", "peu", "plusieurs", "moitié", "quart", "tiers", "demi", "entier", "entière"}
+# mots éliminés de la normalisation, réunis pour un seul test d'appartenance par mot
+MOTS_EXCLUS = frozenset(STOPWORDS | ADJECTIFS | QUANTITES)
+
+# expressions régulières de normalize_name, compilées une seule fois
+_PARENTHESES_RE = re.compile(r"\s*\([^)]*\)")
+_SEPARATEURS_RE = re.compile(r"[-/]|\s+ou\s+")
+_QUANTITE_UNITE_RE = re.compile(r"\b\d+([.,]\d+)?\s*(" + "|".join(UNITES) + r")\b")
+_NOMBRE_RE = re.compile(r"\d+([.,]\d+)?")
+_CARACTERES_EXCLUS_RE = re.compile(r"[^a-zàâäéèêëïîôöùûüç\s-]")
+
+@functools.lru_cache(maxsize=8192)
 def normalize_name(texte):
     """Normalize a product name (lowercase, remove accents, special chars).
 
@@ -101,12 +121,12 @@ def normalize_name(texte):
     if not isinstance(texte, str): texte = ""
 
     # on enlève les parenthèses et le contenu entre parenthèses
-    texte = re.sub(r"\s*\([^)]*\)", "", texte)
+    texte = _PARENTHESES_RE.sub("", texte)
     if not isinstance(texte, str): texte = ""
     texte = texte.strip()
 
     # on enlève les traits d'union et les slashs
-    split_result = re.split(r"[-/]|\s+ou\s+", texte)
+    split_result = _SEPARATEURS_RE.split(texte)
     if split_result:
         texte = split_result[0]
         if not isinstance(texte, str):
@@ -116,28 +136,20 @@ def normalize_name(texte):
     texte = texte.strip()
 
     # on enlève les unités de mesure
-    pattern_unit = r"\b\d+([.,]\d+)?\s*(" + "|".join(UNITES) + r")\b"
-    texte = re.sub(pattern_unit, "", texte)
+    texte = _QUANTITE_UNITE_RE.sub("", texte)
     if not isinstance(texte, str): texte = ""
 
     # on enlève les nombres
-    texte = re.sub(r"\d+([.,]\d+)?", "", texte)
+    texte = _NOMBRE_RE.sub("", texte)
     if not isinstance(texte, str): texte = ""
 
     # on enlève les accents
-    texte = re.sub(r"[^a-zàâäéèêëïîôöùûüç\s-]", "", texte)
+    texte = _CARACTERES_EXCLUS_RE.sub("", texte)
     if not isinstance(texte, str): texte = ""
 
-    ADJECTIFS = {"frais", "fraiche", "fraîche", "bio", "entier", "entiere", 
-                 "petit", "petite", "grand", "grande", "moyen", "moyenne", "sec", "sèche", "moelleux", "moelleuse", "demi", "demie", "nouveau", 
-                 "nouvelle", "vieux", "vieille", "jeune", "rond", "ronde", "long", "longue", "court", "courte", "gros", "grosse", "fin", "fine", 
-                 "épais", "épaisse", "blanc", "blanche", "rouge", "jaune", "vert", "verte", "noir", "noire", "rose", "violet", "violette", "orange", 
-                 "doré", "dorée", "brun", "brune", "cru", "crue", "cuit", "cuite", "surgelé", "surgelée", "nature", "complet", "complète", "allégé", 
-                 "allégée", "léger", "légère", "extra", "double", "triple", "simple", "sec", "secs", "sèche", "sèches"}
-    QUANTITES = {"quelques", "beaucoup", "peu", "plusieurs", "moitié", "quart", "tiers", "demi", "entier", "entière"}
     mots = texte.split()
     # on enlève les stopwords, les adjectifs et les quantités
-    mots_nettoyes = [mot for mot in mots if mot not in STOPWORDS and mot not in ADJECTIFS and mot not in QUANTITES]
+    mots_nettoyes = [mot for mot in mots if mot not in MOTS_EXCLUS]
 
     mots_nettoyes = [mot for mot in mots_nettoyes if isinstance(mot, str)]
     # on ne garde que les caractères ascii et on enlève les accents
@@ -156,6 +168,30 @@ def parse_ingredient_details_fr_en(ingredient_string: str) -> Dict[str, Any]:
                         "parsed_name", et "quantity_grams".
     La conversion en grammes est approximative.
     """
+    # on renvoie un nouveau dictionnaire à chaque appel : les appelants le complètent
+    return dict(_parse_ingredient_details_cached(ingredient_string))
+
+@functools.lru_cache(maxsize=8192)
+def _parse_ingredient_details_cached(ingredient_string: str) -> tuple:
+    """
+    Analyse une chaîne d'ingrédient, mise en cache par chaîne : l'analyse ne dépend que de son entrée.
+
+    Args:
+        ingredient_string (str): Chaîne décrivant l'ingrédient.
+    Returns:
+        tuple: Paires (clé, valeur) du résultat de l'analyse (immuable, pour être partagé sans risque par le cache).
+    """
+    return tuple(_parse_ingredient_details(ingredient_string).items())
+
+def _parse_ingredient_details(ingredient_string: str) -> Dict[str, Any]:
+    """
+    Analyse une chaîne d'ingrédient (voir parse_ingredient_details_fr_en).
+
+    Args:
+        ingredient_string (str): Chaîne décrivant l'ingrédient.
+    Returns:
+        Dict[str, Any]: Résultat de l'analyse.
+    """
     original_string = ingredient_string
     text = ingredient_string.lower().strip()
 
@@ -265,6 +301,29 @@ def parse_ingredient_details_fr_en(ingredient_string: str) -> Dict[str, Any]:
         "quantity_grams": quantity_grams if quantity_grams is not None else (DEFAULT_QUANTITY_GRAMS if quantity_str else None)
     }
 
+def load_vectorize_model():
+    """
+    Charge le modèle SentenceTransformer au premier appel, puis renvoie toujours la même instance.
+
+    Returns:
+        SentenceTransformer: Le modèle utilisé pour vectoriser les noms.
+    """
+    if not hasattr(vectorize_name, 'model'):
+        vectorize_name.model = SentenceTransformer('all-MiniLM-L6-v2') # type: ignore
+    return vectorize_name.model # type: ignore
+
+@functools.lru_cache(maxsize=4096)
+def _encode_name(name):
+    """
+    Calcule l'embedding d'un nom, mis en cache par nom : le modèle est déterministe.
+
+    Args:
+        name (str): The name to vectorize.
+    Returns:
+        tuple: Vector representation (immuable, pour être partagée sans risque par le cache)
+    """
+    return tuple(load_vectorize_model().encode([name], show_progress_bar=False)[0].tolist())
+
 def vectorize_name(name):
     """
     Vectorise un nom de produit en utilisant un modèle SentenceTransformer.
@@ -274,9 +333,21 @@ def vectorize_name(name):
     Returns:
         list: Vector representation
     """
-    if not hasattr(vectorize_name, 'model'):
-        vectorize_name.model = SentenceTransformer('all-MiniLM-L6-v2') # type: ignore
-    return vectorize_name.model.encode([name], show_progress_bar=False)[0].tolist() # type: ignore
+    # on renvoie une nouvelle liste à chaque appel pour que l'appelant ne modifie pas la valeur en cache
+    return list(_encode_name(name))
+
+def vectorize_names(names):
+    """
+    Vectorise plusieurs noms en un seul passage du modèle SentenceTransformer.
+
+    Args:
+        names (list): Les noms à vectoriser.
+    Returns:
+        list: Une représentation vectorielle (liste) par nom, dans le même ordre.
+    """
+    if not names:
+        return []
+    return load_vectorize_model().encode(list(names), show_progress_bar=False).tolist()
 
 def safe_execute(cur, sql, params=None):
     """
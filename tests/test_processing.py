@@ -4,6 +4,59 @@ from processing import utils
 from processing import agribalyse_api
 from processing import openfoodfacts_script
 
+class DummyPgCursor:
+    """
+    Curseur psycopg2 factice : enregistre les requêtes exécutées et renvoie les lignes calculées par `results`.
+    """
+    def __init__(self, results=None):
+        self.results = results or (lambda sql, params: [])
+        self.queries = []
+        self.params = []
+        self.last = []
+        self.itersize = None
+    def execute(self, sql, params=None):
+        self.queries.append(sql)
+        self.params.append(params)
+        self.last = list(self.results(sql, params))
+    def fetchall(self):
+        return self.last
+    def fetchone(self):
+        return self.last[0] if self.last else None
+    def __iter__(self):
+        return iter(self.last)
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def close(self):
+        pass
+
+class DummyPgConn:
+    """
+    Connexion psycopg2 factice : un curseur partagé, un curseur serveur (cursor(name=...)) et le compte des commits.
+    """
+    def __init__(self, results=None, scan_rows=()):
+        self.cur = DummyPgCursor(results)
+        self.scan = DummyPgCursor(lambda sql, params: scan_rows)
+        self.commits = 0
+        self.rollbacks = 0
+    def cursor(self, name=None):
+        return self.scan if name else self.cur
+    def commit(self):
+        self.commits += 1
+    def rollback(self):
+        self.rollbacks += 1
+
+@pytest.fixture
+def pg_conn():
+    """
+    Fabrique de connexions psycopg2 factices, partagée par les tests des requêtes SQL.
+
+    Returns:
+        type: La classe DummyPgConn, à appeler avec `results` (sql, params) -> lignes et/ou `scan_rows`.
+    """
+    return DummyPgConn
+
 def test_normalize_name():
     """
     Teste la normalisation d'un nom (accents, espaces, etc).
@@ -231,3 +284,319 @@ def test_extract_all_recipes(monkeypatch):
     recipes = scraping_marmiton.extract_all_recipes()
     assert isinstance(recipes, list)
     assert recipes and recipes[0].get("title") == "Tarte"
+
+def test_compute_ingredient_name_links_exact_before_fuzzy(pg_conn):
+    """
+    Teste que les correspondances nom -> product_vector sont calculées en une requête pour tous les noms :
+    correspondance exacte par jointure sur le nom, recherche floue (opérateur %) seulement pour les noms sans correspondance exacte.
+
+    Args:
+        pg_conn: fixture fournissant une connexion psycopg2 factice
+    Returns:
+        None
+    """
+    from processing import build_ingredient_links
+    rows = [("tomate", 1, 1.0), ("courgette", 2, 0.4)]
+    conn = pg_conn(lambda sql, params: rows if "unnest" in sql else [])
+    assert build_ingredient_links._compute_ingredient_name_links(conn.cur, ["tomate", "courgette", "tomate", ""], 0.25) == rows
+    queries = conn.cur.queries
+    assert len(queries) == 2
+    assert conn.cur.params[0] == ("0.25",)
+    # un seul aller-retour pour tous les noms, dédoublonnés et sans le nom vide
+    assert conn.cur.params[1] == (["courgette", "tomate"],)
+    sql = " ".join(queries[1].split())
+    assert "JOIN product_vector pv ON pv.name = names_to_link.name" in sql
+    assert "JOIN product_vector pv ON pv.name %% names_to_link.name" in sql
+    assert "WHERE NOT EXISTS (SELECT 1 FROM exact_matches WHERE exact_matches.name = names_to_link.name)" in sql
+    assert "similarity(pv.name, names_to_link.name) >=" not in sql
+    assert build_ingredient_links._compute_ingredient_name_links(conn.cur, [""], 0.25) == []
+    assert len(conn.cur.queries) == 2
+
+def test_fill_ingredient_name_links_inserts_by_batch(monkeypatch, pg_conn):
+    """
+    Teste que le précalcul des liens nom -> product_vector vide la table, puis calcule et insère les liens par lots de noms.
+
+    Args:
+        monkeypatch: fixture pytest pour patcher execute_values
+        pg_conn: fixture fournissant une connexion psycopg2 factice
+    Returns:
+        None
+    """
+    from processing import build_ingredient_links
+    matches = {"tomate": ("tomate", 1, 1.0), "courgette": ("courgette", 2, 0.4), "oignon": ("oignon", 3, 0.5)}
+    def results(sql, params):
+        if "unnest" in sql:
+            return [matches[name] for name in params[0]]
+        return []
+    inserted = []
+    monkeypatch.setattr(build_ingredient_links, "execute_values", lambda cur, sql, rows, page_size: inserted.append(list(rows)))
+    conn = pg_conn(results)
+    build_ingredient_links.fill_ingredient_name_links(conn, ["tomate", "courgette", ""])
+    assert conn.cur.queries[0].startswith("TRUNCATE")
+    assert inserted == [[("courgette", 2, 0.4), ("tomate", 1, 1.0)]]
+    assert conn.commits == 1
+    inserted.clear()
+    build_ingredient_links._link_ingredient_names(conn.cur, ["tomate", "courgette", "oignon"], 0.25, batch_size=2)
+    assert inserted == [[("courgette", 2, 0.4), ("oignon", 3, 0.5)], [("tomate", 1, 1.0)]]
+
+def test_fill_ingredient_links_inserts_by_batch(monkeypatch, pg_conn):
+    """
+    Teste que les liens entre ingrédients sont insérés par lots pendant le parcours de product_vector.
+
+    Args:
+        monkeypatch: fixture pytest pour patcher find_similar_ingredients et execute_values
+        pg_conn: fixture fournissant une connexion psycopg2 factice
+    Returns:
+        None
+    """
+    from processing import build_ingredient_links
+    batches = []
+    monkeypatch.setattr(build_ingredient_links, "find_similar_ingredients", lambda name, source, conn: {"openfoodfacts": {"id": 100, "score": 0.9}})
+    monkeypatch.setattr(build_ingredient_links, "execute_values", lambda cur, sql, rows, page_size: batches.append(list(rows)))
+    conn = pg_conn(scan_rows=[(i, f"produit {i}", "agribalyse") for i in range(5)])
+    build_ingredient_links.fill_ingredient_links(conn, batch_size=2)
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert batches[0][0] == (0, "agribalyse", 100, "openfoodfacts", 0.9)
+    assert conn.commits == 1
+
+def test_ingredient_details_cache_ttl_eviction_and_clear(monkeypatch):
+    """
+    Teste le cache des détails d'ingrédients de l'API : clé par seuils, expiration (TTL), éviction LRU et vidage.
+
+    Args:
+        monkeypatch: fixture pytest pour remplacer le calcul des détails, l'horloge et les paramètres du cache
+    Returns:
+        None
+    """
+    from api.services import product_query_helper as helper
+    calls = []
+    def fake_details(db, names, min_linked, min_initial):
+        calls.append(set(names))
+        return {name: {"original_normalized_search_name": name} for name in names}
+    now = [1000.0]
+    monkeypatch.setattr(helper, "_get_details_for_ingredients", fake_details)
+    monkeypatch.setattr(helper, "monotonic", lambda: now[0])
+    monkeypatch.setattr(helper, "INGREDIENT_DETAILS_CACHE_TTL", 10)
+    monkeypatch.setattr(helper, "INGREDIENT_DETAILS_CACHE_MAXSIZE", 2)
+    helper.clear_ingredient_details_cache()
+    get = lambda name, min_linked: helper._get_cached_details_for_ingredients(None, {name}, min_linked, 0.25)
+    try:
+        get("tomate", 0.6)
+        assert get("tomate", 0.6) == {"tomate": {"original_normalized_search_name": "tomate"}}
+        assert len(calls) == 1
+        # d'autres seuils forment une autre clé
+        get("tomate", 0.7)
+        assert len(calls) == 2
+        # au-delà de 2 entrées, la moins récemment utilisée est évincée
+        get("courgette", 0.6)
+        get("tomate", 0.7)
+        assert len(calls) == 3
+        get("tomate", 0.6)
+        assert len(calls) == 4
+        # les entrées expirent après le TTL
+        now[0] += 11
+        get("tomate", 0.6)
+        assert len(calls) == 5
+        get("tomate", 0.6)
+        assert len(calls) == 5
+        # le vidage force un nouveau calcul
+        helper.clear_ingredient_details_cache()
+        get("tomate", 0.6)
+        assert len(calls) == 6
+    finally:
+        helper.clear_ingredient_details_cache()
+
+def test_create_missing_product_vectors_ignores_conflicting_names():
+    """
+    Teste que la création des ProductVector manquants ignore un nom inséré entre-temps par une requête concurrente
+    (ON CONFLICT DO NOTHING) au lieu d'échouer, et ne renvoie que les ProductVector créés.
+
+    Args:
+        Aucun
+    Returns:
+        None
+    """
+    from sqlalchemy.dialects import postgresql
+    from api.services.product_creation import create_missing_product_vectors
+    class DummyResult:
+        def __init__(self, rows):
+            self.rows = rows
+        def all(self):
+            return self.rows
+    class DummySession:
+        def __init__(self):
+            self.statements = []
+        def execute(self, stmt):
+            self.statements.append(stmt)
+            # "courgette" vient d'être créée par une autre requête : seule "tomate" est insérée
+            return DummyResult([(1, "tomate")])
+    db = DummySession()
+    assert create_missing_product_vectors(db, ["tomate", "courgette"]) == [(1, "tomate")]
+    assert len(db.statements) == 1
+    sql = str(db.statements[0].compile(dialect=postgresql.psycopg2.dialect()))
+    assert "WHERE NOT (EXISTS" in sql
+    assert "ON CONFLICT ON CONSTRAINT uq_product_vector_name_source DO NOTHING" in sql
+    assert sql.endswith("RETURNING product_vector.id, product_vector.name")
+    assert create_missing_product_vectors(db, []) == []
+    assert len(db.statements) == 1
+
+def test_ingredient_name_links_refresh_failure_keeps_links(monkeypatch, pg_conn):
+    """
+    Teste qu'un échec de la mise à jour de ingredient_name_link, faite dans sa propre transaction,
+    n'annule pas les liens déjà validés et ne fait pas passer le job à 'failed'.
+
+    Args:
+        monkeypatch: fixture pytest pour patcher execute_values et la mise à jour des noms d'ingrédients
+        pg_conn: fixture fournissant une connexion psycopg2 factice
+    Returns:
+        None
+    """
+    import logging
+    from api.services import product_creation
+    def failing_refresh(cur, product_names):
+        raise RuntimeError("ingredient_name_link indisponible")
+    inserted = []
+    failed_jobs = []
+    released = []
+    monkeypatch.setattr(product_creation, "execute_values", lambda cur, sql, rows, **kwargs: inserted.extend(rows))
+    monkeypatch.setattr(product_creation, "refresh_ingredient_name_links", failing_refresh)
+    monkeypatch.setattr(product_creation, "_mark_product_job_failed", lambda *args: failed_jobs.append(args))
+    conn = pg_conn()
+    product_creation.update_ingredient_links_for_products(
+        [(1, "tomate", "manual")],
+        lambda name, source, c: {"agribalyse": {"id": 7, "score": 0.8}},
+        lambda: conn,
+        released.append,
+        logging.getLogger("test"),
+        job_id="job"
+    )
+    assert inserted == [(1, "manual", 7, "agribalyse", 0.8)]
+    assert conn.cur.params[-1][0] == "done"
+    # les liens et le job sont validés avant la mise à jour des noms, dont seul l'échec est annulé
+    assert conn.commits == 1
+    assert conn.rollbacks == 1
+    assert failed_jobs == []
+    assert released == [conn]
+
+def test_etag_middleware_keeps_headers_and_not_modified():
+    """
+    Teste le middleware ETag : seuls les GET 200 des routes publiques reçoivent un ETag, les en-têtes d'origine
+    (plusieurs Set-Cookie) sont conservés et la réponse 304 reprend Cache-Control et Vary.
+
+    Args:
+        Aucun
+    Returns:
+        None
+    """
+    from fastapi import FastAPI, Response
+    from fastapi.testclient import TestClient
+    from api.main import add_etag_middleware
+    app = FastAPI()
+    app.middleware("http")(add_etag_middleware)
+    @app.get("/api/public/items")
+    def get_items(response: Response):
+        response.set_cookie("first", "1")
+        response.set_cookie("second", "2")
+        response.headers["Cache-Control"] = "public, max-age=60"
+        response.headers["Vary"] = "Accept"
+        return {"items": [1, 2]}
+    @app.post("/api/public/items")
+    def post_items():
+        return {"created": True}
+    client = TestClient(app)
+    response = client.get("/api/public/items")
+    assert response.status_code == 200
+    assert response.json() == {"items": [1, 2]}
+    etag = response.headers["etag"]
+    assert len(response.headers.get_list("set-cookie")) == 2
+    assert response.headers["content-length"] == str(len(response.content))
+    not_modified = client.get("/api/public/items", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+    assert not_modified.headers["cache-control"] == "public, max-age=60"
+    assert not_modified.headers["vary"] == "Accept"
+    assert "etag" not in client.post("/api/public/items").headers
+
+def test_vectorize_name_is_cached(monkeypatch):
+    """
+    Teste que l'embedding d'un même nom n'est calculé qu'une fois et que chaque appel renvoie une liste indépendante.
+
+    Args:
+        monkeypatch: fixture pytest pour remplacer le modèle SentenceTransformer
+    Returns:
+        None
+    """
+    import numpy as np
+    class DummyModel:
+        def __init__(self):
+            self.calls = 0
+        def encode(self, names, show_progress_bar=False):
+            self.calls += 1
+            return np.array([[0.1, 0.2, 0.3]])
+    model = DummyModel()
+    monkeypatch.setattr(utils.vectorize_name, "model", model, raising=False)
+    utils._encode_name.cache_clear()
+    first = utils.vectorize_name("banane")
+    first.append(1.0)
+    second = utils.vectorize_name("banane")
+    utils._encode_name.cache_clear()
+    assert model.calls == 1
+    assert second == [0.1, 0.2, 0.3]
+
+def test_vectorize_names_single_model_call(monkeypatch):
+    """
+    Teste que plusieurs noms sont vectorisés en un seul appel au modèle, dans l'ordre d'entrée.
+
+    Args:
+        monkeypatch: fixture pytest pour remplacer le modèle SentenceTransformer
+    Returns:
+        None
+    """
+    import numpy as np
+    class DummyModel:
+        def __init__(self):
+            self.calls = 0
+        def encode(self, names, show_progress_bar=False):
+            self.calls += 1
+            return np.array([[float(len(name))] for name in names])
+    model = DummyModel()
+    monkeypatch.setattr(utils.vectorize_name, "model", model, raising=False)
+    assert utils.vectorize_names(["kiwi", "banane"]) == [[4.0], [6.0]]
+    assert utils.vectorize_names([]) == []
+    assert model.calls == 1
+
+def test_find_similar_ingredients_single_query(pg_conn):
+    """
+    Teste que la recherche d'ingrédients similaires se fait en une requête et filtre les scores trop faibles.
+
+    Args:
+        pg_conn: fixture fournissant une connexion psycopg2 factice
+    Returns:
+        None
+    """
+    from processing.ingredient_similarity import find_similar_ingredients
+    rows = [(1, "tomate", "greenpeace", 1.0), (2, "tomates", "openfoodfacts", 0.9), (3, "tome", "marmiton", 0.2), (4, "tomate", "manual", None)]
+    conn = pg_conn(lambda sql, params: rows)
+    results = find_similar_ingredients("tomate", "agribalyse", conn)
+    assert len(conn.cur.params) == 1
+    assert conn.cur.params[0]["exact_sources"] == ["greenpeace"]
+    # un candidat sous ce seuil pg_trgm ne peut pas atteindre 0.65, même avec une similarité vectorielle de 1
+    assert abs(conn.cur.params[0]["trgm_threshold"] - 0.25 / 0.6) < 1e-9
+    assert set(results) == {"greenpeace", "openfoodfacts"}
+    assert results["openfoodfacts"] == {"id": 2, "name": "tomates", "score": 0.9}
+
+def test_parse_ingredient_details_returns_independent_dicts():
+    """
+    Teste que le cache de l'analyse d'ingrédients renvoie un dictionnaire indépendant à chaque appel.
+
+    Args:
+        Aucun
+    Returns:
+        None
+    """
+    first = utils.parse_ingredient_details_fr_en("250g de sucre")
+    first["normalized_name_for_matching"] = "sucre"
+    second = utils.parse_ingredient_details_fr_en("250g de sucre")
+    assert "normalized_name_for_matching" not in second
+    assert second == {k: v for k, v in first.items() if k != "normalized_name_for_matching"}